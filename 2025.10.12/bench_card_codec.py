@@ -0,0 +1,138 @@
+# bench_card_codec.py
+# 角色卡编解码的微基准测试：python bench_card_codec.py [世界书条目数 | 角色卡目录]
+
+import os
+import sys
+import json
+import time
+import zlib
+import base64
+import random
+
+import core_utils
+from core_utils import json_loads, json_dumps, extract_character_data_from_png
+
+
+def make_sample_card(entry_count):
+    """生成一张带大型世界书的角色卡，内容混合中英文，接近真实卡片。"""
+    rng = random.Random(42)
+    words = ["王国", "骑士", "魔法", "森林", "古老的", "契约", "dragon", "city", "guild", "秘密", "的", "在"]
+
+    def text(n):
+        return "".join(rng.choice(words) for _ in range(n))
+
+    entries = [{
+        "keys": [text(2) for _ in range(3)],
+        "content": text(200),
+        "enabled": True,
+        "comment": "",
+        "constant": False,
+        "selective": True,
+        "insertion_order": 100,
+        "extensions": {},
+        "id": i
+    } for i in range(entry_count)]
+
+    return {
+        "spec": "chara_card_v2",
+        "spec_version": "2.0",
+        "data": {
+            "name": "基准测试角色",
+            "description": text(500),
+            "personality": text(100),
+            "scenario": text(100),
+            "first_mes": text(300),
+            "mes_example": text(300),
+            "tags": ["测试", "benchmark"],
+            "creator": "bench",
+            "alternate_greetings": [text(100) for _ in range(5)],
+            "character_book": {"name": "世界书", "entries": entries},
+            "extensions": {}
+        }
+    }
+
+
+def best_of(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_json(card):
+    payload = json_dumps(card)
+    print(f"JSON 负载大小: {len(payload) / 1024 / 1024:.2f} MB")
+
+    orjson_backend = core_utils.orjson
+    candidates = [
+        ("标准库 json.loads/json.dumps", None, lambda: json.loads(payload),
+         lambda: json.dumps(card, ensure_ascii=False).encode('utf-8')),
+        ("json_loads/json_dumps (标准库后端)", None, lambda: json_loads(payload), lambda: json_dumps(card)),
+    ]
+    if orjson_backend is not None:
+        candidates.append(("json_loads/json_dumps (orjson 后端)", orjson_backend,
+                           lambda: json_loads(payload), lambda: json_dumps(card)))
+    else:
+        print("未安装 orjson，只测试标准库后端。")
+
+    baseline = None
+    try:
+        for label, backend, loads, dumps in candidates:
+            core_utils.orjson = backend
+            load_time = best_of(loads)
+            dump_time = best_of(dumps)
+            if baseline is None:
+                baseline = load_time + dump_time
+            print(f"{label:<36} 解析 {load_time * 1000:8.2f} ms  序列化 {dump_time * 1000:8.2f} ms  "
+                  f"加速 {baseline / (load_time + dump_time):5.2f}x")
+    finally:
+        core_utils.orjson = orjson_backend
+
+
+def load_sample_library(folder):
+    """读取目录下所有角色卡的数据，作为压缩测试的样本库。"""
+    cards = []
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith('.png'):
+            data, _ = extract_character_data_from_png(os.path.join(folder, name))
+            if data:
+                cards.append(data)
+    return cards
+
+
+def bench_compression(cards):
+    """比较不同 zlib 等级下 chara 数据块的大小与编解码耗时（None 即未压缩的 tEXt）。"""
+    payloads = [base64.b64encode(json_dumps(card)) for card in cards]
+    raw_size = sum(len(payload) for payload in payloads)
+    print(f"样本: {len(cards)} 张卡片, 未压缩 base64 共 {raw_size / 1024 / 1024:.2f} MB")
+
+    for level in (None, 1, 3, 6, 9):
+        if level is None:
+            encoded = payloads
+            encode_time = 0.0
+            decode = lambda: [json_loads(base64.b64decode(payload)) for payload in encoded]
+        else:
+            encode_time = best_of(lambda: [zlib.compress(payload, level) for payload in payloads], repeat=3)
+            encoded = [zlib.compress(payload, level) for payload in payloads]
+            decode = lambda: [json_loads(base64.b64decode(zlib.decompress(payload))) for payload in encoded]
+        size = sum(len(payload) for payload in encoded)
+        decode_time = best_of(decode, repeat=3)
+        label = "tEXt (不压缩)" if level is None else f"zTXt 等级 {level}"
+        print(f"{label:<14} 大小 {size / 1024 / 1024:8.2f} MB ({size / raw_size:6.1%})  "
+              f"压缩 {encode_time * 1000:8.2f} ms  读取 {decode_time * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    argument = sys.argv[1] if len(sys.argv) > 1 else "5000"
+    if os.path.isdir(argument):
+        library = load_sample_library(argument)
+        if not library:
+            sys.exit(f"目录中没有可读取的角色卡: {argument}")
+        bench_json(max(library, key=lambda card: len(json_dumps(card))))
+    else:
+        library = [make_sample_card(int(argument))]
+        bench_json(library[0])
+    print()
+    bench_compression(library)
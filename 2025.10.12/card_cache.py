@@ -0,0 +1,257 @@
+# card_cache.py
+
+import os
+import zlib
+import sqlite3
+from collections import OrderedDict, namedtuple
+
+from core_utils import CardSummary, json_loads, json_dumps
+
+QUERY_BATCH_SIZE = 500
+
+
+def stat_key(path):
+    """返回用于判断缓存是否过期的 (文件大小, 修改时间纳秒)，文件不存在时返回 None。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class CardEntry(namedtuple('CardEntry', ['size', 'mtime_ns', 'inode'])):
+    """扫描工作区时从 DirEntry 得到的文件信息。"""
+
+    __slots__ = ()
+
+    @property
+    def stat_key(self):
+        return self.size, self.mtime_ns
+
+
+def scan_card_files(root, recursive=False):
+    """用 os.scandir 列出 root 下的 PNG 文件，返回 ({路径: CardEntry}, [扫描过的目录])。
+
+    大小和修改时间直接取自 DirEntry（Windows 上不需要额外的系统调用），调用方应当复用它们，
+    不必再逐个 os.stat。以 "." 开头的文件和目录（包括写入角色卡时的临时文件）会被跳过，
+    递归时不跟随目录的符号链接。
+    """
+    cards = {}
+    directories = []
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            scanner = os.scandir(directory)
+        except OSError:
+            continue
+        directories.append(directory)
+        with scanner:
+            for entry in scanner:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_file():
+                        if entry.name.lower().endswith('.png'):
+                            st = entry.stat()
+                            cards[entry.path] = CardEntry(st.st_size, st.st_mtime_ns, entry.inode())
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                except OSError:
+                    continue
+    return cards, directories
+
+
+class CardCache:
+    """角色卡解析结果的持久化缓存，保存在 SQLite 中。
+
+    每条记录以路径为主键，并记下解析时文件的大小和修改时间；两者任一变化即视为过期。
+    摘要总会写入，完整数据只在打开过详情页后才写入（zlib 压缩）。
+    另外保存角色数据的摘要值（带索引，用于查找角色数据相同的卡片）和整个文件内容的摘要值；
+    文件摘要只在导入时遇到大小相同的文件才计算，同样按大小和修改时间判断是否过期。
+    """
+
+    SCHEMA_VERSION = 4
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        try:
+            self.conn = self._open()
+        except sqlite3.DatabaseError:
+            # 缓存文件损坏时直接丢弃重建，缓存内容都可以从角色卡重新解析出来
+            os.remove(db_path)
+            self.conn = self._open()
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS cards")
+                conn.execute("DROP TABLE IF EXISTS file_hashes")
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cards (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    summary BLOB NOT NULL,
+                    payload BLOB,
+                    payload_digest TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cards_payload_digest ON cards (payload_digest)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL
+                )
+            """)
+            conn.commit()
+        except sqlite3.DatabaseError:
+            conn.close()
+            raise
+        return conn
+
+    def close(self):
+        self.conn.close()
+
+    def _select_in(self, sql, column, values):
+        """按 column IN (...) 分批执行 sql（其中的 {} 处放占位符），依次返回各行。"""
+        values = list(values)
+        # 按主键或索引分批查询，取出少量记录时不必扫描整张表
+        for start in range(0, len(values), QUERY_BATCH_SIZE):
+            batch = values[start:start + QUERY_BATCH_SIZE]
+            yield from self.conn.execute(sql.format(f"{column} IN ({','.join('?' * len(batch))})"), batch)
+
+    def get_summaries(self, stats):
+        """stats 为 {路径: (大小, 修改时间)}，返回其中缓存仍然有效的 {路径: CardSummary}。"""
+        summaries = {}
+        rows = self._select_in("SELECT path, size, mtime_ns, summary FROM cards WHERE {}", "path", stats)
+        for path, size, mtime_ns, summary in rows:
+            if stats[path] == (size, mtime_ns):
+                summaries[path] = CardSummary.from_dict(json_loads(summary))
+        return summaries
+
+    def put_summaries(self, entries):
+        """entries 为 [(路径, (大小, 修改时间), CardSummary)]，在一个事务中写入。"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cards (path, size, mtime_ns, summary, payload, payload_digest) "
+                "VALUES (?, ?, ?, ?, NULL, ?)",
+                [(path, stat[0], stat[1], json_dumps(summary.to_dict()), summary.payload_digest or None)
+                 for path, stat, summary in entries]
+            )
+
+    def find_payload_duplicates(self, digests, stats):
+        """digests 为角色数据摘要值的集合，返回 {摘要值: [路径]}，只包含 stats 中且缓存未过期的卡片。"""
+        found = {}
+        rows = self._select_in("SELECT path, size, mtime_ns, payload_digest FROM cards WHERE {}",
+                               "payload_digest", digests)
+        for path, size, mtime_ns, digest in rows:
+            if stats.get(path) == (size, mtime_ns):
+                found.setdefault(digest, []).append(path)
+        return found
+
+    def get_content_hashes(self, stats):
+        """stats 为 {路径: (大小, 修改时间)}，返回其中仍然有效的 {路径: 文件摘要值}。"""
+        hashes = {}
+        rows = self._select_in("SELECT path, size, mtime_ns, content_hash FROM file_hashes WHERE {}", "path", stats)
+        for path, size, mtime_ns, content_hash in rows:
+            if stats[path] == (size, mtime_ns):
+                hashes[path] = content_hash
+        return hashes
+
+    def put_content_hashes(self, entries):
+        """entries 为 [(路径, (大小, 修改时间), 文件摘要值)]，在一个事务中写入。"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                [(path, stat[0], stat[1], content_hash) for path, stat, content_hash in entries]
+            )
+
+    def get_payload(self, path, stat):
+        """返回缓存的 (完整数据, 格式)，没有缓存或已过期时返回 None。"""
+        row = self.conn.execute(
+            "SELECT summary, payload FROM cards WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, stat[0], stat[1])
+        ).fetchone()
+        if row is None or row[1] is None:
+            return None
+        return json_loads(zlib.decompress(row[1])), json_loads(row[0]).get('format')
+
+    def put_payload(self, path, stat, summary, data):
+        """同时写入摘要和完整数据。"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cards (path, size, mtime_ns, summary, payload, payload_digest) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, stat[0], stat[1], json_dumps(summary.to_dict()), zlib.compress(json_dumps(data), 1),
+                 summary.payload_digest or None)
+            )
+
+    def remove(self, paths):
+        rows = [(path,) for path in paths]
+        with self.conn:
+            self.conn.executemany("DELETE FROM cards WHERE path = ?", rows)
+            self.conn.executemany("DELETE FROM file_hashes WHERE path = ?", rows)
+
+    def prune(self, valid_paths):
+        """删除工作区中已不存在的角色卡的缓存。"""
+        stale = {path for (path,) in self.conn.execute("SELECT path FROM cards UNION SELECT path FROM file_hashes")
+                 if path not in valid_paths}
+        if stale:
+            self.remove(stale)
+
+
+class PayloadLRU:
+    """按估算字节数限制容量的 LRU，保存最近用到的角色卡完整数据。
+
+    超出容量时从最久未用的开始淘汰，但最近放入的一项总会保留，即使它本身就超过了容量。
+    被淘汰的数据之后由 DataManager 从 CardCache 或角色卡文件重新读取。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()   # 路径 -> (数据, 估算字节数)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, size):
+        self.pop(key)
+        self._entries[key] = (value, size)
+        self.total_bytes += size
+        self._evict()
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        self.total_bytes -= entry[1]
+        return entry[0]
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
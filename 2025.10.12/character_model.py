@@ -0,0 +1,364 @@
+# character_model.py
+
+from collections import OrderedDict
+
+from PySide6.QtCore import Qt, QAbstractItemModel, QModelIndex, QMimeData
+from PySide6.QtGui import QIcon, QPixmap, QColor
+
+from icon_loader import IconLoader
+from thumbnail_cache import THUMBNAIL_SIZE
+
+FETCH_BATCH_SIZE = 256
+ICON_CACHE_SIZE = 2048  # 内存中最多保留的图标数，每个 64x64 的图标约 16 KB
+CARD_MIME_TYPE = "application/x-character-card-paths"
+
+
+class _GroupNode:
+    """一个分组在模型中的状态：paths 是模型自己持有的路径列表，fetched 是已经交给视图的行数。
+
+    rows 是 路径 -> 行号 的索引，查找某张卡片所在的行不必线性扫描 paths。
+    """
+
+    __slots__ = ("name", "paths", "fetched", "rows")
+
+    def __init__(self, name, paths):
+        self.name = name
+        self.paths = list(paths)
+        self.fetched = 0
+        self.rows = {path: row for row, path in enumerate(self.paths)}
+
+    def extend(self, paths):
+        start = len(self.paths)
+        self.paths.extend(paths)
+        self.rows.update((path, row) for row, path in enumerate(paths, start))
+
+    def delete(self, first, last):
+        """删除 [first, last] 行；之后各行的行号要由调用方最后统一 reindex。"""
+        for path in self.paths[first:last + 1]:
+            del self.rows[path]
+        del self.paths[first:last + 1]
+
+    def reindex(self, start):
+        self.rows.update((self.paths[row], row) for row in range(start, len(self.paths)))
+
+
+class CharacterTreeModel(QAbstractItemModel):
+    """角色列表的两级模型：顶层是分组，子级是角色卡。
+
+    分组下的角色卡通过 canFetchMore/fetchMore 分批交给视图，名称和图标只在视图绘制某一行时
+    才读取，因此十万张卡片也不会在启动时逐个创建节点和图标。图标由 IconLoader 在后台加载，
+    到达之前显示占位图标。已加载的图标按最近使用保留 ICON_CACHE_SIZE 个，淘汰的行再次绘制时重新加载。
+    数据的增删改通过 DataManager 的信号同步为对应行的插入、删除和刷新。
+    设置过滤条件后各分组只显示条件中的卡片，分组本身仍然全部保留，可以照常拖放。
+    """
+
+    def __init__(self, data_manager, parent=None):
+        super().__init__(parent)
+        self.data_manager = data_manager
+        self._groups = []
+        self._group_rows = {}   # _GroupNode -> 分组所在的行
+        self._icons = OrderedDict()     # 路径 -> QIcon，最近用到的在末尾
+        self._filter = None     # None 表示不过滤，否则为要显示的路径集合
+        self.icon_loader = IconLoader(data_manager.thumbnail_cache, self)
+        self.icon_loader.icon_loaded.connect(self._on_icon_loaded)
+        placeholder = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        placeholder.fill(QColor(200, 200, 200, 120))
+        self._placeholder_icon = QIcon(placeholder)
+
+        data_manager.cards_added.connect(self._on_cards_added)
+        data_manager.cards_removed.connect(self._on_cards_removed)
+        data_manager.card_updated.connect(self._on_card_updated)
+        data_manager.cards_moved.connect(self._on_cards_moved)
+        data_manager.group_added.connect(self._on_group_added)
+        data_manager.group_removed.connect(self._on_group_removed)
+        data_manager.group_renamed.connect(self._on_group_renamed)
+
+    def reload(self):
+        """按 DataManager 当前的分组重建模型，角色卡行等视图需要时再分批取出。"""
+        self.beginResetModel()
+        self._set_groups()
+        self._icons.clear()
+        self.icon_loader.retain(())
+        self.endResetModel()
+
+    def set_filter(self, paths):
+        """只显示 paths 中的角色卡；传入 None 取消过滤。
+
+        与当前的过滤条件相同时什么也不做并返回 False，不会重置模型（选中、展开和滚动位置都保持不变）。
+        """
+        if paths == self._filter:
+            return False
+        self._filter = paths
+        # 已加载的图标继续沿用，只重建各分组的行
+        self.beginResetModel()
+        self._set_groups()
+        self.endResetModel()
+        return True
+
+    def _set_groups(self):
+        self._groups = [_GroupNode(name, self._visible(paths)) for name, paths in self.data_manager.groups.items()]
+        self._update_group_rows()
+
+    def _update_group_rows(self):
+        self._group_rows = {node: row for row, node in enumerate(self._groups)}
+
+    def _visible(self, paths):
+        if self._filter is None:
+            return paths
+        return [path for path in paths if path in self._filter]
+
+    # --- 索引 ---
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column)
+        # 角色卡行的 internalPointer 指向所属分组，分组行没有 internalPointer
+        return self.createIndex(row, column, self._groups[parent.row()])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        node = index.internalPointer()
+        if node is None:
+            return QModelIndex()
+        return self.createIndex(self._group_rows[node], 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self._groups)
+        if parent.internalPointer() is None and parent.column() == 0:
+            return self._groups[parent.row()].fetched
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return bool(self._groups)
+        if parent.internalPointer() is None:
+            return bool(self._groups[parent.row()].paths)
+        return False
+
+    def canFetchMore(self, parent):
+        if not parent.isValid() or parent.internalPointer() is not None:
+            return False
+        node = self._groups[parent.row()]
+        return node.fetched < len(node.paths)
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        node = self._groups[parent.row()]
+        start = node.fetched
+        end = min(start + FETCH_BATCH_SIZE, len(node.paths))
+        # 一批行的摘要一次性取出，避免绘制时逐行查询缓存
+        self.data_manager.load_summaries(node.paths[start:end])
+        self.beginInsertRows(parent, start, end - 1)
+        node.fetched = end
+        self.endInsertRows()
+
+    # --- 数据 ---
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if node is None:
+            group = self._groups[index.row()]
+            if role == Qt.DisplayRole:
+                return group.name
+            if role == Qt.UserRole:
+                return "group"
+            return None
+
+        path = node.paths[index.row()]
+        if role == Qt.DisplayRole:
+            return self.data_manager.load_summary(path).name
+        if role == Qt.DecorationRole:
+            return self._icon(path)
+        if role == Qt.UserRole:
+            return path
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and section == 0:
+            return "角色分组"
+        return None
+
+    def _icon(self, path):
+        icon = self._icons.get(path)
+        if icon is not None:
+            self._icons.move_to_end(path)
+            return icon
+        if self.data_manager.load_summary(path).format == "Invalid":
+            icon = QIcon()
+            self._store_icon(path, icon)
+            return icon
+        self.icon_loader.request(path, self.data_manager.file_stats.get(path))
+        return self._placeholder_icon
+
+    def retain_icons(self, paths):
+        """取消 paths 之外（已滚出视口）的行还在排队的图标任务。"""
+        self.icon_loader.retain(paths)
+
+    def _store_icon(self, path, icon):
+        self._icons[path] = icon
+        self._icons.move_to_end(path)
+        while len(self._icons) > ICON_CACHE_SIZE:
+            self._icons.popitem(last=False)
+
+    def _on_icon_loaded(self, path, image):
+        self._store_icon(path, QIcon() if image.isNull() else QIcon(QPixmap.fromImage(image)))
+        index = self.card_index(path)
+        if index.isValid():
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def group_name(self, index):
+        """返回索引所在的分组名称；分组行返回自身名称。"""
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        return self._groups[index.row()].name if node is None else node.name
+
+    def card_index(self, path):
+        """返回角色卡所在行的索引，尚未取出的行返回无效索引。"""
+        group_row = self._group_row(self.data_manager.group_of(path))
+        if group_row is None:
+            return QModelIndex()
+        row = self._groups[group_row].rows.get(path)
+        if row is None or row >= self._groups[group_row].fetched:
+            return QModelIndex()
+        return self.index(row, 0, self.index(group_row, 0))
+
+    # --- 拖放 ---
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if index.internalPointer() is None:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDropEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    def mimeTypes(self):
+        return [CARD_MIME_TYPE]
+
+    def mimeData(self, indexes):
+        paths = [self.data(index, Qt.UserRole) for index in indexes if index.internalPointer() is not None]
+        mime_data = QMimeData()
+        mime_data.setData(CARD_MIME_TYPE, "\n".join(paths).encode('utf-8'))
+        return mime_data
+
+    def dropMimeData(self, data, action, row, column, parent):
+        group_name = self.group_name(parent)
+        if group_name is None or not data.hasFormat(CARD_MIME_TYPE):
+            return False
+        paths = [path for path in bytes(data.data(CARD_MIME_TYPE)).decode('utf-8').split("\n") if path]
+        # 行的移动由 cards_moved 信号完成，视图不需要再删除源行
+        self.data_manager.move_cards(paths, group_name)
+        return False
+
+    # --- DataManager 信号 ---
+
+    def _group_row(self, group_name):
+        for row, node in enumerate(self._groups):
+            if node.name == group_name:
+                return row
+        return None
+
+    def _insert_paths(self, group_row, paths):
+        node = self._groups[group_row]
+        if node.fetched < len(node.paths):
+            # 末尾还有未取出的行，新卡片随之后的 fetchMore 一起出现
+            node.extend(paths)
+            return
+        # 已全部取出时直接插入，但一次最多一批，其余的同样交给 fetchMore
+        count = min(len(paths), FETCH_BATCH_SIZE)
+        self.beginInsertRows(self.index(group_row, 0), node.fetched, node.fetched + count - 1)
+        node.extend(paths)
+        node.fetched += count
+        self.endInsertRows()
+
+    def _remove_paths(self, group_row, paths):
+        node = self._groups[group_row]
+        rows = sorted({node.rows[path] for path in paths if path in node.rows})
+        parent = self.index(group_row, 0)
+        # 从后往前按连续区间删除，前面区间的行号不受影响
+        end = len(rows) - 1
+        while end >= 0:
+            start = end
+            while start > 0 and rows[start - 1] == rows[start] - 1:
+                start -= 1
+            first, last = rows[start], rows[end]
+            if last >= node.fetched:
+                # 尚未取出的部分视图并不知道，直接删掉
+                node.delete(max(first, node.fetched), last)
+                last = node.fetched - 1
+            if first <= last:
+                self.beginRemoveRows(parent, first, last)
+                node.delete(first, last)
+                node.fetched -= last - first + 1
+                self.endRemoveRows()
+            end = start - 1
+        if rows:
+            node.reindex(rows[0])
+
+    def _on_cards_added(self, paths, group_name):
+        group_row = self._group_row(group_name)
+        if group_row is None:
+            self._on_group_added(group_name)
+            group_row = len(self._groups) - 1
+        paths = self._visible(paths)
+        if paths:
+            self._insert_paths(group_row, paths)
+
+    def _on_cards_removed(self, paths, group_name):
+        for path in paths:
+            self._icons.pop(path, None)
+            self.icon_loader.cancel(path)
+        group_row = self._group_row(group_name)
+        if group_row is not None:
+            self._remove_paths(group_row, paths)
+
+    def _on_card_updated(self, path):
+        self._icons.pop(path, None)
+        self.icon_loader.cancel(path)
+        index = self.card_index(path)
+        if index.isValid():
+            self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.DecorationRole])
+
+    def _on_cards_moved(self, paths, old_group, new_group):
+        old_row = self._group_row(old_group)
+        if old_row is not None:
+            self._remove_paths(old_row, paths)
+        self._on_cards_added(paths, new_group)
+
+    def _on_group_added(self, group_name):
+        row = len(self._groups)
+        self.beginInsertRows(QModelIndex(), row, row)
+        node = _GroupNode(group_name, [])
+        self._groups.append(node)
+        self._group_rows[node] = row
+        self.endInsertRows()
+
+    def _on_group_removed(self, group_name):
+        row = self._group_row(group_name)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._groups[row]
+        self._update_group_rows()
+        self.endRemoveRows()
+
+    def _on_group_renamed(self, old_name, new_name):
+        row = self._group_row(old_name)
+        if row is None:
+            return
+        self._groups[row].name = new_name
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole])
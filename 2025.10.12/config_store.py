@@ -0,0 +1,76 @@
+# config_store.py
+
+import os
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from core_utils import json_dumps
+
+CONFIG_WRITE_DELAY_MS = 500
+
+
+class ConfigStore(QObject):
+    """config.json 的延迟写入。
+
+    schedule 只启动一个短暂的计时器，窗口期内的多次修改合并成一次写入；
+    内容和上次写入（或启动时读到）的完全一致时不写。写入先落到临时文件再 os.replace，
+    不会留下写了一半的配置文件。退出前必须调用 flush。
+    写入失败时修改仍记为未保存（之后的 schedule 或 flush 会再试），并通过 write_failed 通知界面。
+    """
+
+    write_failed = Signal(str)      # 错误信息
+
+    def __init__(self, path, snapshot, delay_ms=CONFIG_WRITE_DELAY_MS, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.snapshot = snapshot
+        self._pending = False
+        self._last_written = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def read(self):
+        """读取配置文件的原始内容，同时记下它用于之后判断内容是否变化；文件不存在时返回 None。"""
+        try:
+            with open(self.path, 'rb') as f:
+                self._last_written = f.read()
+        except FileNotFoundError:
+            self._last_written = None
+        return self._last_written
+
+    def schedule(self):
+        self._pending = True
+        # 计时器已在运行时不重新计时，持续的修改也不会把写入无限推迟
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """立即写入尚未保存的修改，返回是否成功（没有需要写入的内容也算成功）。"""
+        self._timer.stop()
+        if not self._pending:
+            return True
+        data = json_dumps(self.snapshot(), indent=2)
+        if data == self._last_written:
+            self._pending = False
+            return True
+
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            self.write_failed.emit(str(e))
+            return False
+        self._pending = False
+        self._last_written = data
+        return True
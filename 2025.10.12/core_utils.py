@@ -5,9 +5,25 @@ import sys
 import json
 import base64
 import zlib
+import shutil
+import tempfile
+import mmap
+import hashlib
+import math
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from PIL import Image
 import struct
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 def get_base_path():
     """获取应用的基础路径，兼容打包和开发环境。"""
     if hasattr(sys, '_MEIPASS'):
@@ -19,159 +35,576 @@ CARD_WORKSPACE = os.path.join(APP_DIR, "Character_Cards")
 BOOK_WORKSPACE = os.path.join(APP_DIR, "World_Books")
 CONFIG_FILE = os.path.join(APP_DIR, "config.json")
 
-def _read_png_chunks(file_path):
-    """手动从PNG文件流中读取所有块，不依赖Pillow。"""
-    with open(file_path, 'rb') as f:
-        png_signature = f.read(8)
-        if png_signature != b'\x89PNG\r\n\x1a\n':
+def json_loads(data):
+    """解析JSON文本（str/bytes/memoryview），安装了 orjson 时优先使用 orjson。"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # orjson 比标准库严格（例如不接受 NaN），失败时交给标准库再试一次
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+def _has_non_finite_float(obj):
+    """obj 中是否含有 NaN 或正负无穷。"""
+    pending = [obj]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            pending.extend(value)
+    return False
+
+def json_dumps(obj, indent=None):
+    """序列化为UTF-8字节并保留非ASCII字符。
+
+    indent 只支持 None（紧凑）或 2。两种后端的输出解析后得到相同的值，排版也相同，
+    但浮点数的写法可能不同（例如标准库写 1e-07，orjson 写 1e-7），需要逐字节稳定的场合不要用它，
+    见 payload_digest。NaN 和正负无穷 orjson 会写成 null，遇到时改用标准库写成 NaN / Infinity。
+    """
+    if indent not in (None, 2):
+        raise ValueError("indent 只支持 None 或 2。")
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            result = orjson.dumps(obj, option=option)
+        except (orjson.JSONEncodeError, TypeError):
+            pass  # 超出64位的整数等 orjson 不支持的值交给标准库
+        else:
+            # 非有限浮点数只会变成 null，输出里没有 null 时不必再检查
+            if b'null' not in result or not _has_non_finite_float(obj):
+                return result
+    separators = (',', ':') if indent is None else (',', ': ')
+    return json.dumps(obj, ensure_ascii=False, indent=indent, separators=separators).encode('utf-8')
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+TEXT_CHUNK_TYPES = (b'tEXt', b'zTXt', b'iTXt')
+CHARACTER_KEYWORDS = (b'chara', b'ccv3')
+COPY_BLOCK_SIZE = 1024 * 1024
+FICLONE = 0x40049409    # Linux 的 ioctl(FICLONE)，btrfs / XFS 等文件系统上共享数据块而不实际复制
+PROCESS_POOL_THRESHOLD = 256  # 卡片数量达到该值时改用进程池，避开GIL
+EXTRACT_BATCH_SIZE = 32
+
+def _make_png_chunk(chunk_type, chunk_content):
+    """按 长度 + 类型 + 数据 + CRC 的格式构造一个PNG块。"""
+    return (struct.pack('>I', len(chunk_content)) + chunk_type + chunk_content +
+            struct.pack('>I', zlib.crc32(chunk_type + chunk_content)))
+
+IEND_CHUNK = _make_png_chunk(b'IEND', b'')
+
+class ChunkIndex:
+    """把PNG文件内存映射一次，并记录每个块的 (类型, 偏移, 数据长度)。
+
+    块数据以 memoryview 切片的形式返回，不复制字节；只有真正访问到的页才会被读入，
+    遍历块头时不会读取 IDAT 像素数据。切片只在索引关闭前有效。
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.chunks = []
+        self._file = open(file_path, 'rb')
+        try:
+            # 空文件无法映射，mmap 会抛出 ValueError
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            self._build()
+        except BaseException:
+            self.close()
+            raise
+
+    def _build(self):
+        if self._map[:8] != PNG_SIGNATURE:
             raise ValueError("文件不是一个有效的PNG。")
 
-        while True:
-            chunk_length_bytes = f.read(4)
-            if not chunk_length_bytes:
+        size = len(self._map)
+        offset = 8
+        while offset + 8 <= size:
+            length, chunk_type = struct.unpack_from('>I4s', self._map, offset)
+            if offset + 12 + length > size:
+                break  # 文件被截断，忽略不完整的块
+            self.chunks.append((chunk_type, offset, length))
+            if chunk_type == b'IEND':
                 break
-            chunk_length = struct.unpack('>I', chunk_length_bytes)[0]
-            chunk_type = f.read(4)
-            chunk_data = f.read(chunk_length)
-            f.read(4)  # CRC校验码
+            offset += 12 + length
 
-            yield chunk_type, chunk_data
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        view = getattr(self, '_view', None)
+        if view is not None:
+            view.release()
+            self._view = None
+        file_map = getattr(self, '_map', None)
+        if file_map is not None:
+            try:
+                file_map.close()
+            except BufferError:
+                pass  # 仍有外部切片引用映射，等它们被回收后映射会自动释放
+            self._map = None
+        self._file.close()
+
+    @property
+    def has_iend(self):
+        return bool(self.chunks) and self.chunks[-1][0] == b'IEND'
+
+    def payload(self, chunk):
+        """返回块数据的 memoryview 切片。"""
+        _, offset, length = chunk
+        return self._view[offset + 8:offset + 8 + length]
+
+    def keyword(self, chunk):
+        """返回文本块的关键字（PNG规定最长79字节），非文本块或格式错误时返回 None。"""
+        chunk_type, offset, length = chunk
+        if chunk_type not in TEXT_CHUNK_TYPES:
+            return None
+        start = offset + 8
+        separator = self._map.find(b'\x00', start, start + min(length, 80))
+        if separator < 0:
+            return None
+        return self._map[start:separator]
+
+    def text_chunks(self):
+        """依次产出 (块类型, 关键字, 关键字之后的数据切片)。"""
+        for chunk_type, offset, length in self.chunks:
+            keyword = self.keyword((chunk_type, offset, length))
+            if keyword is not None:
+                yield chunk_type, keyword, self._view[offset + 8 + len(keyword) + 1:offset + 8 + length]
+
+    def is_character_chunk(self, chunk):
+        keyword = self.keyword(chunk)
+        return keyword is not None and keyword.lower() in CHARACTER_KEYWORDS
+
+    def character_tail_offset(self):
+        """如果所有角色数据块都紧挨在IEND之前（或文件中根本没有角色数据块），返回这段尾部的起始偏移，否则返回 None。"""
+        if not self.has_iend:
+            raise ValueError("PNG文件不完整，缺少IEND块。")
+
+        tail_index = len(self.chunks) - 1
+        while tail_index > 0 and self.is_character_chunk(self.chunks[tail_index - 1]):
+            tail_index -= 1
+
+        if any(self.is_character_chunk(chunk) for chunk in self.chunks[:tail_index]):
+            return None
+        return self.chunks[tail_index][1]
+
+    def copy_to(self, f_dst, offset, count):
+        """把 [offset, offset + count) 的原始字节追加到无缓冲的目标文件。
+
+        优先使用 os.copy_file_range / os.sendfile 在内核中完成零拷贝，
+        不支持时直接把映射切片分块写出，不额外分配缓冲区。
+        """
+        src_fd, dst_fd = self._file.fileno(), f_dst.fileno()
+
+        zero_copy = getattr(os, 'copy_file_range', None)
+        if zero_copy is None and sys.platform.startswith('linux'):
+            zero_copy = lambda src, dst, n, off: os.sendfile(dst, src, off, n)
+        if zero_copy is not None:
+            try:
+                while count > 0:
+                    copied = zero_copy(src_fd, dst_fd, count, offset)
+                    if copied == 0:
+                        raise ValueError("PNG文件不完整。")
+                    offset += copied
+                    count -= copied
+                return
+            except OSError:
+                # 跨文件系统或内核不支持时，从当前进度继续用普通方式复制
+                pass
+
+        while count > 0:
+            block = min(count, COPY_BLOCK_SIZE)
+            f_dst.write(self._view[offset:offset + block])
+            offset += block
+            count -= block
+
+def _text_chunk_content(chunk_type, data):
+    """解码文本块关键字之后的部分，返回 (原始文本字节, 编码)。
+
+    tEXt/zTXt 为 latin-1，iTXt 为 UTF-8；zTXt 和压缩的 iTXt 会先解压。
+    """
+    if chunk_type == b'tEXt':
+        return data, 'latin-1'
+
+    if chunk_type == b'zTXt':
+        if len(data) == 0 or data[0] != 0:
+            raise ValueError("不支持的zTXt压缩方式。")
+        return zlib.decompress(data[1:]), 'latin-1'
+
+    # iTXt: 压缩标志(1) + 压缩方式(1) + 语言标签\0 + 翻译后的关键字\0 + 文本
+    if len(data) < 2:
+        raise ValueError("iTXt块格式错误。")
+    compressed, method = data[0], data[1]
+    rest = bytes(data[2:])
+    _, _, rest = rest.partition(b'\x00')
+    _, _, text = rest.partition(b'\x00')
+    if compressed:
+        if method != 0:
+            raise ValueError("不支持的iTXt压缩方式。")
+        text = zlib.decompress(text)
+    return text, 'utf-8'
+
+def _character_from_text_info(info):
+    """根据文本元数据（关键字 -> 文本）识别 NovelAI V1 与 Stable Diffusion 图片。"""
+    if 'chara' in info:
+        try:
+            data = json_loads(info['chara'])
+            if 'data' not in data:
+                v2_data = {
+                    'name': data.get('name', ''), 'description': data.get('description', ''),
+                    'personality': data.get('personality', ''), 'scenario': data.get('scenario', ''),
+                    'first_mes': data.get('first_mes', ''), 'mes_example': data.get('mes_example', ''),
+                    'data': data
+                }
+                return v2_data, "NovelAI V1"
+            return data, "NovelAI V1"
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            pass
+
+    if 'parameters' in info:
+        try:
+            sd_text = info['parameters']
+            name_guess = sd_text.split(',')[0].strip()
+            data = {
+                'name': f"[SD] {name_guess[:30]}...",
+                'description': f"这是一个包含Stable Diffusion生成参数的图片。\n\n--- Parameters ---\n{sd_text}",
+                'personality': '', 'scenario': '', 'first_mes': '', 'mes_example': '',
+                'data': {'is_sd_card': True, 'parameters': sd_text}
+            }
+            return data, "Stable Diffusion"
+        except Exception:
+            pass
 
-            if chunk_type == b'IEND':
-                break
+    return None, None
 
-def extract_character_data_from_png(file_path):
-    """从PNG文件中提取角色数据。"""
+def copy_file_fast(src_path, dst_path):
+    """复制文件内容和时间戳、权限位。
+
+    依次尝试 reflink（FICLONE）、os.copy_file_range（同一文件系统上由内核完成，部分文件系统会转为服务端复制），
+    都不可用时退回普通的分块复制。
+    """
+    with open(src_path, 'rb') as f_src, open(dst_path, 'wb') as f_dst:
+        src_fd, dst_fd = f_src.fileno(), f_dst.fileno()
+        copied = False
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                copied = True
+            except OSError:
+                pass
+
+        zero_copy = getattr(os, 'copy_file_range', None)
+        if not copied and zero_copy is not None:
+            remaining = os.fstat(src_fd).st_size
+            offset = 0
+            try:
+                while remaining > 0:
+                    n = zero_copy(src_fd, dst_fd, min(remaining, 1 << 30), offset, offset)
+                    if n == 0:
+                        break
+                    offset += n
+                    remaining -= n
+                copied = remaining == 0
+            except OSError:
+                pass
+            if not copied:
+                # 跨文件系统或内核不支持时从头用普通方式复制
+                f_dst.truncate(0)
+
+        if not copied:
+            f_src.seek(0)
+            f_dst.seek(0)
+            shutil.copyfileobj(f_src, f_dst, COPY_BLOCK_SIZE)
+    shutil.copystat(src_path, dst_path)
+
+def payload_digest(data):
+    """角色数据的摘要值，用来发现图片不同但角色数据完全相同的卡片。
+
+    解析文件和保存编辑时都对数据重新序列化后的规范形式求摘要，而不是对文件中的原始文本块，
+    否则同一份数据换一种写法（例如缩进不同）就对不上了。规范形式固定由标准库生成，
+    不用 json_dumps，这样摘要值与是否安装 orjson 无关，缓存中的摘要值换了环境仍然可用。
+    """
+    json_bytes = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(json_bytes, digest_size=16).hexdigest()
+
+def content_digest(file_path):
+    """整个文件内容的摘要值，用来发现逐字节相同的文件。"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _extract_character_payload(file_path):
+    """提取角色数据，返回 (数据, 格式, 文本块大小, JSON大小, JSON摘要)。
+
+    tEXt/zTXt/iTXt 文本块由 ChunkIndex 直接解码，全程不解压像素数据；
+    只有文件缺少IEND块（已损坏或被截断）时才交给 Pillow 判断。
+    """
     try:
-        chara_v2_data = None
-        chara_v3_data = None
-
-        for chunk_type, chunk_data in _read_png_chunks(file_path):
-            keyword = None
-            decoded_text = None
-
-            if chunk_type == b'tEXt':
-                if b'\x00' in chunk_data:
-                    keyword_bytes, text_bytes = chunk_data.split(b'\x00', 1)
-                    keyword = keyword_bytes.decode('latin-1').lower()
-                    if keyword in ['chara', 'ccv3']:
-                        try:
-                            decoded_text = base64.b64decode(text_bytes).decode('utf-8')
-                        except Exception:
-                            continue
+        payloads = {}
+        text_info = {}
 
-            elif chunk_type == b'zTXt':
-                if b'\x00' in chunk_data:
-                    keyword_bytes, compressed_part = chunk_data.split(b'\x00', 1)
-                    keyword = keyword_bytes.decode('latin-1').lower()
-                    if keyword in ['chara', 'ccv3'] and compressed_part[0] == 0:
+        with ChunkIndex(file_path) as index:
+            for chunk_type, keyword_bytes, text_bytes in index.text_chunks():
+                keyword = keyword_bytes.decode('latin-1')
+                lowered = keyword.lower()
+                if lowered not in ['chara', 'ccv3'] and keyword != 'parameters':
+                    continue
+
+                try:
+                    raw_text, encoding = _text_chunk_content(chunk_type, text_bytes)
+                    decoded_text = None
+                    if lowered in ['chara', 'ccv3']:
+                        # 只有严格的 base64 且解出 UTF-8 JSON 对象才算角色数据；NovelAI V1 的原始 JSON
+                        # 有时恰好也能被宽松地当作 base64 解码，那样得到的是乱码
                         try:
-                            decompressed = zlib.decompress(compressed_part[1:])
-                            decoded_text = base64.b64decode(decompressed).decode('utf-8')
+                            encoded = bytes(raw_text).translate(None, b' \t\r\n')
+                            decoded_text = base64.b64decode(encoded, validate=True)
+                            data = json_loads(decoded_text.decode('utf-8'))
+                            if not isinstance(data, dict):
+                                raise ValueError("角色数据不是 JSON 对象。")
                         except Exception:
-                            continue
+                            decoded_text = None
 
-            if decoded_text:
-                if keyword == 'chara':
-                    chara_v2_data = decoded_text
-                elif keyword == 'ccv3':
-                    chara_v3_data = decoded_text
+                    if decoded_text:
+                        payloads[lowered] = (data, decoded_text, len(raw_text))
+                    else:
+                        # 非base64的chara（NovelAI V1的原始JSON）与SD参数，留给后面的回退解析
+                        text_info[lowered if lowered == 'chara' else keyword] = str(raw_text, encoding, 'replace')
+                except Exception:
+                    continue
+                finally:
+                    text_bytes.release()
 
-        if chara_v3_data:
-            return json.loads(chara_v3_data), "TavernAI V3"
-        if chara_v2_data:
-            return json.loads(chara_v2_data), "TavernAI V2"
+            has_iend = index.has_iend
 
-        with Image.open(file_path) as img:
-            img.load()
-            info = img.info or {}
+        for keyword, format_str in (('ccv3', "TavernAI V3"), ('chara', "TavernAI V2")):
+            if keyword in payloads:
+                data, decoded_text, payload_size = payloads[keyword]
+                return data, format_str, payload_size, len(decoded_text), payload_digest(data)
 
-            if 'chara' in info:
-                try:
-                    data = json.loads(info['chara'])
-                    if 'data' not in data:
-                        v2_data = {
-                            'name': data.get('name', ''), 'description': data.get('description', ''),
-                            'personality': data.get('personality', ''), 'scenario': data.get('scenario', ''),
-                            'first_mes': data.get('first_mes', ''), 'mes_example': data.get('mes_example', ''),
-                            'data': data
-                        }
-                        return v2_data, "NovelAI V1"
-                    return data, "NovelAI V1"
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
-            if 'parameters' in info:
-                try:
-                    sd_text = info['parameters']
-                    name_guess = sd_text.split(',')[0].strip()
-                    data = {
-                        'name': f"[SD] {name_guess[:30]}...",
-                        'description': f"这是一个包含Stable Diffusion生成参数的图片。\n\n--- Parameters ---\n{sd_text}",
-                        'personality': '', 'scenario': '', 'first_mes': '', 'mes_example': '',
-                        'data': {'is_sd_card': True, 'parameters': sd_text}
-                    }
-                    return data, "Stable Diffusion"
-                except Exception:
-                    pass
+        if not has_iend:
+            with Image.open(file_path) as img:
+                img.load()
+                text_info = img.info or {}
+
+        data, format_str = _character_from_text_info(text_info)
+        text_size = sum(len(text) for text in text_info.values() if isinstance(text, str))
+        return data, format_str, text_size, text_size, ''
 
     except (IOError, ValueError):
-        return None, "Invalid Image"
+        return None, "Invalid Image", 0, 0, ''
     except Exception:
         pass
 
-    return None, None
+    return None, None, 0, 0, ''
 
-def write_character_data_to_png(file_path, character_data):
-    """将角色数据写入PNG文件。"""
+def extract_character_data_from_png(file_path):
+    """从PNG文件中提取角色数据。"""
+    data, format_str, _, _, _ = _extract_character_payload(file_path)
+    if not isinstance(data, dict):
+        return None, format_str
+    return data, format_str
+
+class CardSummary:
+    """角色卡在列表中显示所需的摘要，不持有世界书、对话示例等完整数据。"""
+
+    __slots__ = ('name', 'creator', 'tags', 'format', 'spec_version', 'payload_size', 'json_size', 'payload_digest')
+
+    def __init__(self, name='', creator='', tags=(), format=None, spec_version='', payload_size=0, json_size=0,
+                 payload_digest=''):
+        self.name = name
+        self.creator = creator
+        self.tags = list(tags)
+        self.format = format
+        self.spec_version = spec_version
+        self.payload_size = payload_size
+        self.json_size = json_size
+        self.payload_digest = payload_digest
+
+    @classmethod
+    def from_character_data(cls, data, format_str, payload_size=0, json_size=0, payload_digest=''):
+        inner = data.get('data')
+        if not isinstance(inner, dict):
+            inner = {}
+        tags = inner.get('tags') or data.get('tags') or []
+        return cls(
+            name=inner.get('name') or data.get('name', "未知名称"),
+            creator=inner.get('creator') or data.get('creator', ''),
+            tags=[str(tag) for tag in tags] if isinstance(tags, list) else [],
+            format=format_str,
+            spec_version=str(data.get('spec_version', '')),
+            payload_size=payload_size,
+            json_size=json_size,
+            payload_digest=payload_digest,
+        )
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**{key: values[key] for key in cls.__slots__ if key in values})
+
+def extract_card_summary(file_path):
+    """只提取角色卡摘要，完整数据解析后立即丢弃。返回 (摘要, 格式)，没有角色数据时摘要为 None。"""
+    data, format_str, payload_size, json_size, digest = _extract_character_payload(file_path)
+    if not data or not isinstance(data, dict):
+        # JSON 数组之类不是对象的“角色数据”按没有角色数据处理
+        return None, format_str
+    return CardSummary.from_character_data(data, format_str, payload_size, json_size, digest), format_str
+
+def _extract_batch(paths, summary_only):
+    extract = extract_card_summary if summary_only else extract_character_data_from_png
+    return [(path,) + extract(path) for path in paths]
+
+def extract_many(paths, workers=None, summary_only=False, use_processes=None):
+    """并行解析多张角色卡，每完成一批就依次产出 (路径, 数据, 格式)，顺序与输入无关。
+
+    summary_only 为 True 时数据是 CardSummary。use_processes 为 None 时按数量自动选择：
+    卡片较多时用进程池让 base64/zlib/JSON 解码用满所有核心，较少时用线程池省去进程启动开销。
+    """
+    paths = list(paths)
+    if not paths:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    if use_processes is None:
+        use_processes = workers > 1 and len(paths) >= PROCESS_POOL_THRESHOLD
+
+    # 进程池按批提交以摊薄进程间通信的开销，同时保证每个进程都分到几批任务
+    batch_size = max(1, min(EXTRACT_BATCH_SIZE, len(paths) // (workers * 4))) if use_processes else 1
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=min(workers, len(batches))) as executor:
+        futures = [executor.submit(_extract_batch, batch, summary_only) for batch in batches]
+        for future in as_completed(futures):
+            yield from future.result()
+
+def _reserve_file_space(f, old_size, new_size):
+    """为文件预先分配 old_size 之后直到 new_size 的磁盘空间，空间不足时在这里就抛出 OSError。"""
+    f.flush()
+    if hasattr(os, 'posix_fallocate'):
+        os.posix_fallocate(f.fileno(), old_size, new_size - old_size)
+    else:
+        # 只截断加长的话多数文件系统只留下空洞，并不真正占用空间，所以实际写入零字节
+        f.seek(old_size)
+        f.write(bytes(new_size - old_size))
+        f.flush()
+    os.fsync(f.fileno())
+
+def _patch_png_tail(file_path, tail_offset, character_chunk):
+    """原地截断并重写文件尾部（角色数据块 + IEND），IDAT等前面的字节保持不动。
+
+    新的尾部比原来长时先预留空间，再覆盖旧的角色数据块，磁盘已满时旧数据不会被破坏；
+    预留失败时恢复原来的文件长度并返回 False，由调用方改用临时文件替换。成功时返回 True。
+    """
+    new_tail = character_chunk + IEND_CHUNK
+    new_size = tail_offset + len(new_tail)
+    with open(file_path, 'r+b') as f:
+        old_size = os.fstat(f.fileno()).st_size
+        if new_size > old_size:
+            try:
+                _reserve_file_space(f, old_size, new_size)
+            except OSError:
+                f.truncate(old_size)
+                return False
+        f.seek(tail_offset)
+        f.write(new_tail)
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+def _write_png_without_characters(index, character_chunk):
+    """把除角色数据块以外的块流式复制到同目录的临时文件，并追加新的角色数据块，返回临时文件路径。"""
+    # 合并相邻的待保留块，减少复制调用次数
+    copy_ranges = []
+    for chunk in index.chunks[:-1]:
+        if index.is_character_chunk(chunk):
+            continue
+        _, offset, length = chunk
+        if copy_ranges and copy_ranges[-1][0] + copy_ranges[-1][1] == offset:
+            copy_ranges[-1][1] += 12 + length
+        else:
+            copy_ranges.append([offset, 12 + length])
+
+    dir_name, base_name = os.path.split(os.path.abspath(index.file_path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{base_name}.", suffix=".tmp", dir=dir_name)
+    try:
+        with os.fdopen(fd, 'wb', buffering=0) as f_out:
+            f_out.write(PNG_SIGNATURE)
+            for offset, count in copy_ranges:
+                index.copy_to(f_out, offset, count)
+            f_out.write(character_chunk + IEND_CHUNK)
+            os.fsync(f_out.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def _replace_file(temp_path, file_path):
+    """用临时文件原子替换目标文件，保留原文件的权限位。"""
+    try:
+        shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _make_character_chunk(character_data, compress_level=None):
+    """构造 chara 数据块：默认是未压缩的 tEXt；给出 zlib 压缩等级时写成 zTXt。
+
+    返回 (数据块, 角色数据大小)，大小的含义与解析时的 CardSummary.payload_size 相同，即块中 base64 文本解压后的长度。
+    """
+    v2_b64_str = base64.b64encode(json_dumps(character_data))
+    if compress_level is None:
+        return _make_png_chunk(b'tEXt', b'chara\x00' + v2_b64_str), len(v2_b64_str)
+    # zTXt: 关键字\0 + 压缩方式(0 = zlib) + 压缩后的文本
+    return (_make_png_chunk(b'zTXt', b'chara\x00\x00' + zlib.compress(v2_b64_str, compress_level)),
+            len(v2_b64_str))
+
+def write_character_data_to_png(file_path, character_data, compress_level=None):
+    """将角色数据写入PNG文件。
+
+    compress_level 为 None 时写入未压缩的 tEXt（兼容只读取 tEXt 的工具），
+    为 1-9 时以该 zlib 等级写入 zTXt，世界书很大的卡片可以明显变小。
+    角色数据块已经位于文件末尾（本函数写出的卡片都是这种布局）时只重写文件尾部，
+    需要加长文件时先预留空间，预留失败才退回下一种方式；
+    否则把其余块流式复制到临时文件后原子替换原文件。两种方式的峰值内存都与图片大小无关。
+    返回 (是否成功, 提示信息, 写入的角色数据大小)，失败时大小为 0；写入后的卡片总是 "TavernAI V2" 格式。
+    """
     try:
         if character_data.get('data', {}).get('is_sd_card'):
-            return False, "Stable Diffusion 卡片是只读的，不支持修改保存。"
-
-        v2_json_str = json.dumps(character_data, ensure_ascii=False)
-        v2_b64_str = base64.b64encode(v2_json_str.encode('utf-8'))
-        v2_chunk_content = b'chara\x00' + v2_b64_str
-
-        with open(file_path, 'rb') as f_in:
-            original_data = f_in.read()
-
-        if not original_data.startswith(b'\x89PNG\r\n\x1a\n'):
-            raise ValueError("Invalid PNG")
-
-        new_png_data = bytearray(b'\x89PNG\r\n\x1a\n')
-        offset = 8
-
-        while offset < len(original_data):
-            length = struct.unpack('>I', original_data[offset:offset + 4])[0]
-            chunk_type = original_data[offset + 4:offset + 8]
-
-            if chunk_type == b'IEND':
-                iend_chunk = original_data[offset: offset + 12 + length]
-                break
-
-            is_char_chunk = False
-            if chunk_type in [b'tEXt', b'zTXt']:
-                if b'\x00' in original_data[offset + 8:offset + 8 + length]:
-                    keyword = original_data[offset + 8:offset + 8 + length].split(b'\x00', 1)[0]
-                    if keyword.lower() in [b'chara', b'ccv3']:
-                        is_char_chunk = True
-
-            if not is_char_chunk:
-                new_png_data.extend(original_data[offset: offset + 12 + length])
-
-            offset += 12 + length
+            return False, "Stable Diffusion 卡片是只读的，不支持修改保存。", 0
 
-        chunk_type = b'tEXt'
-        new_png_data.extend(struct.pack('>I', len(v2_chunk_content)))
-        new_png_data.extend(chunk_type)
-        new_png_data.extend(v2_chunk_content)
-        new_png_data.extend(struct.pack('>I', zlib.crc32(chunk_type + v2_chunk_content)))
+        v2_chunk, payload_size = _make_character_chunk(character_data, compress_level)
 
-        new_png_data.extend(iend_chunk)
+        # 映射必须在截断或替换文件之前关闭（Windows 不允许修改仍被映射的文件）
+        temp_path = None
+        with ChunkIndex(file_path) as index:
+            tail_offset = index.character_tail_offset()
+            if tail_offset is None:
+                temp_path = _write_png_without_characters(index, v2_chunk)
 
-        with open(file_path, 'wb') as f_out:
-            f_out.write(new_png_data)
+        if temp_path is None and not _patch_png_tail(file_path, tail_offset, v2_chunk):
+            # 无法为更长的尾部预留空间，改用临时文件；临时文件也写不下时原文件保持不变
+            with ChunkIndex(file_path) as index:
+                temp_path = _write_png_without_characters(index, v2_chunk)
+        if temp_path is not None:
+            _replace_file(temp_path, file_path)
 
-        return True, "保存成功！"
+        return True, "保存成功！", payload_size
     except Exception as e:
-        return False, f"保存失败: {e}"
\ No newline at end of file
+        return False, f"保存失败: {e}", 0
\ No newline at end of file
@@ -0,0 +1,470 @@
+# data_manager.py
+
+import os
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from core_utils import (
+    extract_character_data_from_png, extract_many, json_loads, json_dumps, payload_digest, CardSummary,
+    CARD_WORKSPACE, BOOK_WORKSPACE, CONFIG_FILE, get_base_path
+)
+from card_cache import CardCache, PayloadLRU, stat_key, scan_card_files
+from thumbnail_cache import ThumbnailCache
+from config_store import ConfigStore
+from group_store import GroupStore
+from workspace_watcher import WorkspaceWatcher
+from trash_bin import TrashBin
+from search_index import SearchIndex, IndexJob, card_text
+
+APP_DIR = get_base_path()
+DEFAULT_GROUP = "未分组"
+DEFAULT_PAYLOAD_CACHE_MB = 256
+INDEX_DELAY_MS = 1000
+
+
+class DataManager(QObject):
+    """角色卡、分组与设置的数据中心。
+
+    所有对分组和角色卡的增删改都通过这里的方法完成，并以信号通知界面做局部更新。
+    """
+
+    cards_added = Signal(list, str)         # 路径列表, 分组
+    cards_removed = Signal(list, str)       # 路径列表, 原分组
+    card_updated = Signal(str)              # 路径（名称、图标等内容变化）
+    card_changed_on_disk = Signal(str)      # 路径（文件被其他程序修改，已重新解析）
+    cards_moved = Signal(list, str, str)    # 路径列表, 原分组, 新分组
+    group_added = Signal(str)
+    group_removed = Signal(str)
+    group_renamed = Signal(str, str)        # 原名称, 新名称
+    search_index_updated = Signal()         # 后台索引任务写入了新内容
+
+    def __init__(self):
+        super().__init__()
+        # 完整数据按字节数有上限，摘要则一直常驻内存
+        self.characters = PayloadLRU(DEFAULT_PAYLOAD_CACHE_MB * 1024 * 1024)
+        self.summaries = {}
+        self.file_stats = {}
+        self.workspace_entries = {}
+        self.workspace_dirs = [CARD_WORKSPACE]
+        # 正在由导入任务写入的目标路径，工作区同步时先不把它们当作新卡片
+        self.pending_imports = set()
+        self.groups = GroupStore()
+        self.settings = {}
+        self.setup_workspace()
+        self.card_cache = CardCache(os.path.join(APP_DIR, "assets", "cache", "cards.sqlite3"))
+        self.search_index = SearchIndex(os.path.join(APP_DIR, "assets", "cache", "search.sqlite3"))
+        self._index_job = None
+        self._index_pending = False
+        # 导入、外部修改之类的变化先攒一会儿，再由一个后台任务统一补全索引
+        self._index_timer = QTimer(self)
+        self._index_timer.setSingleShot(True)
+        self._index_timer.setInterval(INDEX_DELAY_MS)
+        self._index_timer.timeout.connect(self._start_indexing)
+        self.thumbnail_cache = ThumbnailCache(os.path.join(APP_DIR, "assets", "cache", "thumbs"))
+        self.config_store = ConfigStore(CONFIG_FILE, lambda: {"groups": self.groups.to_dict(), "settings": self.settings},
+                                        parent=self)
+        self.load_config()
+        self.apply_cache_settings()
+        self.workspace_watcher = WorkspaceWatcher(CARD_WORKSPACE, self)
+        self.workspace_watcher.set_directories(self.workspace_dirs)
+        self.workspace_watcher.changed.connect(self.reconcile_workspace)
+        self.trash = TrashBin(CARD_WORKSPACE, parent=self)
+        self._trashed_groups = {}   # 批次编号 -> {路径: 原分组}
+        self.trash.expired.connect(lambda batch_id: self._trashed_groups.pop(batch_id, None))
+        self.trash.purged.connect(self._forget_purged)
+        self.schedule_indexing()
+
+    def get_default_settings(self):
+        return {"font_size": 10, "background_left": "", "opacity": 100, "music_playlist": [], "music_volume": 50,
+                "card_compress_level": 0, "payload_cache_mb": DEFAULT_PAYLOAD_CACHE_MB, "scan_subfolders": False}
+
+    def apply_cache_settings(self):
+        self.characters.set_max_bytes(self.settings.get("payload_cache_mb", DEFAULT_PAYLOAD_CACHE_MB) * 1024 * 1024)
+
+    def card_compress_level(self):
+        """写入角色卡时使用的 zlib 压缩等级，0 表示写未压缩的 tEXt。"""
+        return self.settings.get("card_compress_level", 0) or None
+
+    def setup_workspace(self):
+        os.makedirs(CARD_WORKSPACE, exist_ok=True)
+        os.makedirs(BOOK_WORKSPACE, exist_ok=True)
+        os.makedirs(os.path.join(APP_DIR, "assets", "backgrounds"), exist_ok=True)
+        os.makedirs(os.path.join(APP_DIR, "assets", "music"), exist_ok=True)
+        os.makedirs(os.path.join(APP_DIR, "assets", "cache"), exist_ok=True)
+
+    def load_config(self):
+        raw_config = self.config_store.read()
+        if raw_config is not None:
+            config_data = json_loads(raw_config)
+            self.groups = GroupStore.from_dict(config_data.get("groups", {DEFAULT_GROUP: []}))
+            self.settings = self.get_default_settings()
+            self.settings.update(config_data.get("settings", {}))
+        else:
+            self.groups = GroupStore.from_dict({DEFAULT_GROUP: []})
+            self.settings = self.get_default_settings()
+
+        self.workspace_entries = self.scan_workspace()
+        # 扫描时已经拿到了每张卡的大小和修改时间，摘要缓存和缩略图缓存直接使用，不再逐个 stat
+        self.file_stats = {path: entry.stat_key for path, entry in self.workspace_entries.items()}
+        self.card_cache.prune(self.workspace_entries)
+        self.search_index.prune(self.workspace_entries)
+        # 去掉已不存在的文件，再把不属于任何分组的卡片放进"未分组"，两步都只遍历一次
+        self.groups.retain(self.workspace_entries)
+        self.groups.add_group(DEFAULT_GROUP)
+        for path in self.workspace_entries:
+            self.groups.add(path, DEFAULT_GROUP)
+        self.save_config()
+
+    def save_config(self):
+        """登记一次配置修改，实际写入由 ConfigStore 合并后延迟完成。"""
+        self.config_store.schedule()
+
+    def flush_config(self):
+        return self.config_store.flush()
+
+    def scan_workspace(self):
+        """扫描工作区（按设置决定是否包含子文件夹），返回 {路径: CardEntry}。"""
+        entries, self.workspace_dirs = scan_card_files(CARD_WORKSPACE, self.settings.get("scan_subfolders", False))
+        return entries
+
+    def _stat(self, path):
+        stat = self.file_stats.get(path)
+        if stat is None:
+            stat = self.file_stats[path] = stat_key(path)
+        return stat
+
+    def load_character_data(self, path):
+        """返回 {'data', 'format'}；不在内存中（或已被淘汰）时依次从持久化缓存和文件读取。"""
+        entry = self.characters.get(path)
+        if entry is None:
+            stat = self._stat(path)
+            cached = self.card_cache.get_payload(path, stat) if stat else None
+            if cached:
+                data, format_str = cached
+            else:
+                data, format_str = extract_character_data_from_png(path)
+                if data and stat:
+                    # 摘要中已有从文件读出的大小时沿用，不用估算值覆盖
+                    summary = self.summaries.get(path)
+                    payload_size = summary.payload_size if summary is not None and summary.payload_size else None
+                    self.card_cache.put_payload(path, stat, self._summary_from_data(data, format_str, payload_size),
+                                                data)
+
+            if data:
+                entry = {'data': data, 'format': format_str}
+            elif format_str == "Invalid Image":
+                entry = {'data': {'name': '[图片损坏或无法读取]'}, 'format': 'Invalid'}
+            else:
+                entry = {'data': {'name': f'[无角色数据] {os.path.basename(path)}'}, 'format': 'No Data'}
+            self.characters.put(path, entry, self._payload_size(path, entry['data']))
+        return entry
+
+    def _payload_size(self, path, data):
+        """按 JSON 序列化后的大小估算完整数据占用的内存，摘要里已有时不再重新序列化。"""
+        summary = self.summaries.get(path)
+        if summary is not None and summary.json_size:
+            return summary.json_size
+        return len(json_dumps(data))
+
+    @staticmethod
+    def _summary_from_data(data, format_str, payload_size=None):
+        """payload_size 为 None 时按未压缩的 base64 文本长度估算。"""
+        # 与解析文件时一样对数据求摘要，打开或保存过的卡片仍能与内容相同的卡片对上
+        json_size = len(json_dumps(data))
+        if payload_size is None:
+            payload_size = (json_size + 2) // 3 * 4
+        return CardSummary.from_character_data(data, format_str, payload_size, json_size, payload_digest(data))
+
+    def _summary_or_placeholder(self, path, summary, format_str):
+        if summary is not None:
+            return summary
+        if format_str == "Invalid Image":
+            return CardSummary(name='[图片损坏或无法读取]', format='Invalid')
+        return CardSummary(name=f'[无角色数据] {os.path.basename(path)}', format='No Data')
+
+    def load_summary(self, path):
+        """返回列表显示用的摘要；完整数据只在打开详情页时由 load_character_data 解析。"""
+        if path not in self.summaries:
+            self.load_summaries([path])
+        return self.summaries[path]
+
+    def load_summaries(self, paths):
+        """加载尚未在内存中的摘要：先查持久化缓存，只有新增或已修改的角色卡才并行重新解析。"""
+        missing = [path for path in paths if path not in self.summaries]
+        if not missing:
+            return
+
+        stats = {path: self._stat(path) for path in missing}
+        cached = self.card_cache.get_summaries(stats)
+        self.summaries.update(cached)
+
+        parsed_entries = []
+        stale = [path for path in missing if path not in cached]
+        for path, summary, format_str in extract_many(stale, summary_only=True):
+            summary = self._summary_or_placeholder(path, summary, format_str)
+            self.summaries[path] = summary
+            if stats[path] is not None:
+                parsed_entries.append((path, stats[path], summary))
+        if parsed_entries:
+            self.card_cache.put_summaries(parsed_entries)
+
+    def prune_thumbnails(self):
+        """删除不再对应任何角色卡的缩略图；图标按需生成，所以按全部角色卡而不是已显示的计算。"""
+        keep = []
+        for path in self.groups.all_paths():
+            stat = self._stat(path)
+            if stat is not None:
+                keep.append(self.thumbnail_cache.thumb_path(path, stat))
+        self.thumbnail_cache.prune(keep)
+
+    def set_character_data(self, path, data, payload_size):
+        """write_character_data_to_png 成功后同步内存中的完整数据、摘要和持久化缓存。
+
+        payload_size 取 write_character_data_to_png 的返回值；写入的总是 V2 的 chara 块，
+        所以原来是 V3 等其他格式的卡片保存后也记为 "TavernAI V2"。
+        """
+        summary = self._summary_from_data(data, "TavernAI V2", payload_size)
+        self.summaries[path] = summary
+        entry = self.characters.get(path)
+        if entry is not None:
+            entry['data'] = data
+            entry['format'] = summary.format
+            self.characters.put(path, entry, summary.json_size)
+        stat = stat_key(path)
+        self.file_stats[path] = stat
+        if stat:
+            self.card_cache.put_payload(path, stat, summary, data)
+            self.search_index.put([(path, stat, card_text(data))])
+        self.card_updated.emit(path)
+
+    def forget_character(self, path, keep_cache=False):
+        self.characters.pop(path, None)
+        self.summaries.pop(path, None)
+        self.file_stats.pop(path, None)
+        if not keep_cache:
+            self.card_cache.remove([path])
+
+    def reconcile_workspace(self):
+        """让分组与工作区中的实际文件一致：新文件加入"未分组"，消失的文件移除，被改动过的卡片重新解析。
+
+        一次 scandir 同时得到文件列表和 (大小, 修改时间)，不重建列表也不重新解析未变化的卡片。
+        改名（同一 inode、大小和修改时间不变）的卡片保留原来的分组。
+        """
+        previous_entries = self.workspace_entries
+        entries = self.workspace_entries = self.scan_workspace()
+        self.workspace_watcher.set_directories(self.workspace_dirs)
+
+        removed = [path for path in self.groups.all_paths() if path not in entries]
+        added = [path for path in entries if not self.groups.has_card(path) and path not in self.pending_imports]
+        target_groups = {}
+        if removed and added:
+            renamed_from = {previous_entries[path]: path for path in removed if path in previous_entries}
+            for path in added:
+                old_path = renamed_from.get(entries[path])
+                if old_path is not None:
+                    target_groups[path] = self.groups.group_of(old_path)
+
+        if removed:
+            self.remove_cards(removed)
+        if added:
+            for path in added:
+                self.file_stats[path] = entries[path].stat_key
+            by_group = {}
+            for path in added:
+                by_group.setdefault(target_groups.get(path, DEFAULT_GROUP), []).append(path)
+            for group_name, group_paths in by_group.items():
+                self.add_cards(group_paths, group_name)
+
+        for path, entry in entries.items():
+            if self.file_stats.get(path) != entry.stat_key:
+                self.file_stats[path] = entry.stat_key
+                if path in self.summaries:
+                    self.reload_card(path)
+        self.schedule_indexing()
+
+    def known_content_hashes(self):
+        """工作区中已经算过且仍然有效的文件摘要值 {路径: 摘要值}，供导入时判断重复文件。"""
+        return self.card_cache.get_content_hashes(self.file_stats)
+
+    def commit_import(self, imported, reserved_paths, new_hashes=()):
+        """导入任务结束后一次性登记：预先解析好的摘要写入内存和持久化缓存，再把卡片批量加入"未分组"。
+
+        imported 为 [(路径, (大小, 修改时间), 摘要, 格式)]；reserved_paths 是任务开始时预留的全部目标路径；
+        new_hashes 为导入任务新算出的 [(路径, (大小, 修改时间), 文件摘要值)]。
+        返回角色数据与已有卡片（或本次导入的其他卡片）完全相同的 [(新路径, [相同的路径])]，图片可以不同。
+        """
+        self.pending_imports.difference_update(reserved_paths)
+        if new_hashes:
+            self.card_cache.put_content_hashes(new_hashes)
+
+        digests = {summary.payload_digest for _, _, summary, _ in imported if summary and summary.payload_digest}
+        # 先查已有卡片，再登记新卡片，这样查到的都是导入前就在工作区中的
+        same_payload = self.card_cache.find_payload_duplicates(digests, self.file_stats) if digests else {}
+
+        cache_entries = []
+        payload_duplicates = []
+        for path, stat, summary, format_str in imported:
+            summary = self._summary_or_placeholder(path, summary, format_str)
+            self.file_stats[path] = stat
+            self.summaries[path] = summary
+            cache_entries.append((path, stat, summary))
+            if summary.payload_digest:
+                others = same_payload.setdefault(summary.payload_digest, [])
+                if others:
+                    payload_duplicates.append((path, list(others)))
+                others.append(path)
+        if cache_entries:
+            self.card_cache.put_summaries(cache_entries)
+        self.add_cards([path for path, _, _, _ in imported])
+        return payload_duplicates
+
+    def reload_card(self, path):
+        """丢弃该卡片在内存中的数据并重新解析摘要；完整数据等下次需要时再读。"""
+        self.characters.pop(path)
+        self.summaries.pop(path, None)
+        self.load_summary(path)
+        self.card_updated.emit(path)
+        self.card_changed_on_disk.emit(path)
+
+    def group_of(self, path):
+        return self.groups.group_of(path)
+
+    def add_cards(self, paths, group_name=DEFAULT_GROUP):
+        """把已经位于工作区的角色卡加入分组，已经属于某个分组的卡片保持不变。"""
+        added = [path for path in paths if self.groups.add(path, group_name)]
+        if not added:
+            return
+        self.save_config()
+        self.schedule_indexing()
+        self.cards_added.emit(added, group_name)
+
+    def remove_cards(self, paths, keep_cache=False):
+        """从分组和各级缓存中移除角色卡（不删除文件）。
+
+        keep_cache 为 True 时保留持久化缓存中的记录，供移入回收站的卡片还原后直接使用。
+        """
+        removed = {}
+        for path in paths:
+            group_name = self.groups.remove(path)
+            self.forget_character(path, keep_cache=True)
+            if group_name is not None:
+                removed.setdefault(group_name, []).append(path)
+        if not keep_cache:
+            self.card_cache.remove(paths)
+            self.search_index.remove(paths)
+        self.save_config()
+        for group_name, group_paths in removed.items():
+            self.cards_removed.emit(group_paths, group_name)
+
+    def trash_cards(self, paths):
+        """把角色卡文件移入回收站并从分组中移除，返回 (批次编号, 已移除的路径, [(路径, 错误信息)])。"""
+        groups = {path: self.groups.group_of(path) for path in paths}
+        batch_id, moved, errors = self.trash.move_to_trash(paths)
+        self._trashed_groups[batch_id] = {path: groups[path] for path in moved if groups[path] is not None}
+        self.remove_cards(moved, keep_cache=True)
+        return batch_id, moved, errors
+
+    def restore_trashed(self, batch_id):
+        """撤销一次删除：文件改名回原处，卡片回到原来的分组（分组已被删除时放入"未分组"）。
+
+        返回 (已还原的路径, 原位置已被占用而未能还原的路径)。
+        """
+        groups = self._trashed_groups.pop(batch_id, {})
+        restored, failed = self.trash.restore(batch_id)
+        by_group = {}
+        for path in restored:
+            self.file_stats[path] = stat_key(path)
+            group_name = groups.get(path, DEFAULT_GROUP)
+            by_group.setdefault(group_name if group_name in self.groups else DEFAULT_GROUP, []).append(path)
+        for group_name, group_paths in by_group.items():
+            self.add_cards(group_paths, group_name)
+        return restored, failed
+
+    def _forget_purged(self, paths):
+        # 原位置又出现了同名卡片时，缓存记录已经属于那张新卡片
+        stale = [path for path in paths if not self.groups.has_card(path)]
+        if stale:
+            self.card_cache.remove(stale)
+            self.search_index.remove(stale)
+
+    def move_cards(self, paths, new_group):
+        moved = {}
+        for path in paths:
+            old_group = self.groups.move(path, new_group)
+            if old_group is not None:
+                moved.setdefault(old_group, []).append(path)
+        if not moved:
+            return
+        self.save_config()
+        for old_group, group_paths in moved.items():
+            self.cards_moved.emit(group_paths, old_group, new_group)
+
+    def move_card(self, path, new_group):
+        self.move_cards([path], new_group)
+
+    def add_group(self, group_name):
+        if not group_name or not self.groups.add_group(group_name):
+            return False
+        self.save_config()
+        self.group_added.emit(group_name)
+        return True
+
+    def rename_group(self, old_name, new_name):
+        if not new_name or new_name == old_name or not self.groups.rename_group(old_name, new_name):
+            return False
+        self.save_config()
+        self.group_renamed.emit(old_name, new_name)
+        return True
+
+    def remove_group(self, group_name):
+        """删除分组，其中的角色卡移到"未分组"。"""
+        if group_name == DEFAULT_GROUP or group_name not in self.groups:
+            return False
+        paths = self.groups.remove_group(group_name)
+        self.groups.add_group(DEFAULT_GROUP)
+        for path in paths:
+            self.groups.add(path, DEFAULT_GROUP)
+        self.save_config()
+        if paths:
+            self.cards_moved.emit(paths, group_name, DEFAULT_GROUP)
+        self.group_removed.emit(group_name)
+        return True
+
+    # --- 搜索 ---
+
+    def search(self, query):
+        """返回匹配 query 的角色卡路径集合；query 为空或搜索不可用时返回 None。"""
+        return self.search_index.search(query)
+
+    def schedule_indexing(self):
+        if self.search_index.enabled and not self._index_timer.isActive():
+            self._index_timer.start()
+
+    def _start_indexing(self):
+        if self._index_job is not None:
+            # 正在运行的任务结束后会再检查一次
+            self._index_pending = True
+            return
+        self._index_pending = False
+        stats = {path: self._stat(path) for path in self.groups.all_paths()}
+        stale = self.search_index.stale({path: stat for path, stat in stats.items() if stat is not None})
+        if not stale:
+            return
+        self._index_job = IndexJob(self.search_index.db_path, [(path, stats[path]) for path in stale], self)
+        self._index_job.finished.connect(self._on_indexing_finished)
+        self._index_job.start()
+
+    def _on_indexing_finished(self):
+        self._index_job = None
+        self.search_index_updated.emit()
+        if self._index_pending:
+            self.schedule_indexing()
+
+    def close(self):
+        if self._index_job is not None:
+            self._index_job.cancel()
+            self._index_job.wait()
+        self.trash.shutdown()
+        self.flush_config()
+        self.card_cache.close()
+        self.search_index.close()
@@ -166,6 +166,7 @@ class DetailWidget(QWidget):
         self.profile_boxes = {}
         self.filter_checkboxes = {}
         self.greeting_entries = []  # 存储备用问候语条目
+        self.modified = False       # 界面中是否有尚未保存的修改
 
         self.init_ui()
 
@@ -357,6 +358,7 @@ class DetailWidget(QWidget):
         greeting_entry = GreetingEntryBox(greeting_text, index, self)
         self.greeting_entries.append(greeting_entry)
         self.greetings_container_layout.addWidget(greeting_entry)
+        greeting_entry.greeting_edit.textChanged.connect(self.mark_modified)
 
         # 更新文本控件列表用于字体设置
         self.text_widgets.append(greeting_entry.greeting_edit)
@@ -365,12 +367,14 @@ class DetailWidget(QWidget):
         """添加新的空白问候语"""
         new_index = len(self.greeting_entries)
         self.add_greeting_entry("", new_index)
+        self.mark_modified()
 
     def delete_greeting_entry(self, index):
         """删除指定的问候语条目"""
         if 0 <= index < len(self.greeting_entries):
             greeting_entry = self.greeting_entries.pop(index)
             greeting_entry.setParent(None)
+            self.mark_modified()
             greeting_entry.deleteLater()
 
             # 重新索引剩余的条目
@@ -453,6 +457,7 @@ class DetailWidget(QWidget):
 
         enabled_var = QCheckBox("启用")
         enabled_var.setChecked(entry.get("enabled", True))
+        enabled_var.toggled.connect(self.mark_modified)
         content_layout.addWidget(enabled_var)
         box.setContentLayout(content_layout)
         self.entries_layout.addWidget(box)
@@ -485,12 +490,14 @@ class DetailWidget(QWidget):
             }
             self.book_entries_data.append(full_new_entry)
             self.rebuild_book_entries_ui()
+            self.mark_modified()
 
     def delete_book_entry(self, box_widget, index):
         reply = QMessageBox.question(self, "确认删除", f"确定要删除条目 #{index + 1} 吗?")
         if reply == QMessageBox.Yes:
             self.book_entries_data.pop(index)
             self.rebuild_book_entries_ui()
+            self.mark_modified()
 
     def create_labeled_input(self, label_text, key, data_value, multiline=False, parent_layout=None):
         h_layout = QHBoxLayout()
@@ -509,6 +516,9 @@ class DetailWidget(QWidget):
         self.widgets[key] = widget
         if isinstance(widget, QTextEdit):
             self.text_widgets.append(widget)
+            widget.textChanged.connect(self.mark_modified)
+        else:
+            widget.textEdited.connect(self.mark_modified)
 
         h_layout.addWidget(widget)
 
@@ -517,6 +527,10 @@ class DetailWidget(QWidget):
 
         return h_layout
 
+    @Slot()
+    def mark_modified(self):
+        self.modified = True
+
     def update_font_size(self, size):
         font = QFont()
         font.setPointSize(size)
@@ -590,13 +604,14 @@ class DetailWidget(QWidget):
         if updated_data is None:
             return
 
-        success, message = write_character_data_to_png(self.char_path, updated_data)
+        success, message, payload_size = write_character_data_to_png(
+            self.char_path, updated_data, compress_level=self.data_manager.card_compress_level())
         if success:
+            self.modified = False
             QMessageBox.information(self, "成功", message)
             self.char_data = updated_data
-            if self.char_path in self.data_manager.characters:
-                self.data_manager.characters[self.char_path]['data'] = updated_data
-            self.main_window.load_initial_data()
+            self.data_manager.set_character_data(self.char_path, updated_data, payload_size)
+            self.char_format = self.data_manager.summaries[self.char_path].format
         else:
             QMessageBox.critical(self, "失败", message)
 
@@ -615,7 +630,8 @@ class DetailWidget(QWidget):
 
         try:
             shutil.copy2(self.char_path, save_path)
-            success, message = write_character_data_to_png(save_path, current_data)
+            success, message, _ = write_character_data_to_png(save_path, current_data,
+                                                              compress_level=self.data_manager.card_compress_level())
             if success:
                 QMessageBox.information(self, "导出成功", f"角色卡已成功导出到:\n{save_path}")
             else:
@@ -0,0 +1,143 @@
+# export_job.py
+
+import os
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PySide6.QtCore import QThread, Signal
+
+from core_utils import extract_card_summary, copy_file_fast, COPY_BLOCK_SIZE
+from import_job import allocate_destinations
+
+MAX_EXPORT_WORKERS = 8
+
+
+def export_filename(char_name):
+    """以角色名称作为导出文件名，去掉不适合出现在文件名中的字符。"""
+    safe_char_name = "".join(c for c in char_name or "" if c.isalnum() or c in " _-").rstrip()
+    return f"{safe_char_name or 'Unnamed'}.png"
+
+
+class ExportJob(QThread):
+    """在后台线程中把角色卡并行导出到指定目录，以角色名称作为文件名。
+
+    names 是界面线程中已知的 {路径: 角色名称}，缺少的在这里解析；目标目录只列一次，重名在内存中处理。
+    每个文件先写成以 "." 开头的临时文件再改名，取消或出错时不会在目标目录留下不完整的文件。
+    出错的文件不打断其余的导出，结束后统一记在 errors 中。
+    """
+
+    progress = Signal(int, int)     # 已完成数量, 总数
+
+    def __init__(self, paths, export_dir, names, parent=None):
+        super().__init__(parent)
+        self.paths = paths
+        self.export_dir = export_dir
+        self.names = dict(names)
+        self.exported = []                  # [(源路径, 目标路径)]
+        self.errors = []                    # [(源路径, 错误信息)]
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _resolve_names(self, executor):
+        missing = [path for path in self.paths if path not in self.names]
+        for path, (summary, _) in zip(missing, executor.map(self._read_summary, missing)):
+            self.names[path] = summary.name if summary else ""
+
+    def run(self):
+        total = len(self.paths)
+        workers = min(MAX_EXPORT_WORKERS, (os.cpu_count() or 1) * 2)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            self._resolve_names(executor)
+
+            try:
+                taken_names = {name.lower() for name in os.listdir(self.export_dir)}
+            except OSError as e:
+                self.errors = [(path, str(e)) for path in self.paths]
+                return
+            destinations = allocate_destinations([export_filename(self.names[path]) for path in self.paths],
+                                                 self.export_dir, taken_names)
+
+            done = 0
+            futures = {executor.submit(self._export_one, source, dest): (source, dest)
+                       for source, dest in zip(self.paths, destinations)}
+            for future in as_completed(futures):
+                source, dest = futures[future]
+                try:
+                    if future.result():
+                        self.exported.append((source, dest))
+                except Exception as e:
+                    self.errors.append((source, str(e)))
+                done += 1
+                self.progress.emit(done, total)
+
+    def _read_summary(self, path):
+        if self.cancelled:
+            return None, None
+        try:
+            return extract_card_summary(path)
+        except Exception:
+            # 读不出名称的卡片按 "Unnamed" 导出，不影响其余卡片
+            return None, None
+
+    def _export_one(self, source_path, dest_path):
+        if self.cancelled:
+            return False
+        temp_path = os.path.join(os.path.dirname(dest_path), f".{os.path.basename(dest_path)}.export.tmp")
+        try:
+            copy_file_fast(source_path, temp_path)
+            os.replace(temp_path, dest_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return True
+
+
+class ArchiveExportJob(ExportJob):
+    """把角色卡依次写入一个 ZIP 压缩包，条目名与逐个导出时的文件名规则相同。
+
+    PNG 本身已经压缩过，条目一律以 ZIP_STORED 存储，不再 deflate；每张卡片从源文件分块读出后
+    直接写进压缩包，不产生临时文件，整个导出就是对目标文件的一次顺序写入。
+    打不开的卡片跳过并记入 errors；写入压缩包失败（如磁盘已满）或被取消时删除不完整的压缩包。
+    """
+
+    def __init__(self, paths, archive_path, names, parent=None):
+        super().__init__(paths, os.path.dirname(archive_path), names, parent)
+        self.archive_path = archive_path
+        self.failed = False
+
+    def run(self):
+        total = len(self.paths)
+        with ThreadPoolExecutor(max_workers=min(MAX_EXPORT_WORKERS, (os.cpu_count() or 1) * 2)) as executor:
+            self._resolve_names(executor)
+        entry_names = allocate_destinations([export_filename(self.names[path]) for path in self.paths], "", set())
+
+        try:
+            with zipfile.ZipFile(self.archive_path, 'w', zipfile.ZIP_STORED) as archive:
+                for done, (source, entry_name) in enumerate(zip(self.paths, entry_names), 1):
+                    if self.cancelled:
+                        break
+                    try:
+                        info = zipfile.ZipInfo.from_file(source, entry_name)
+                        f_src = open(source, 'rb')
+                    except OSError as e:
+                        self.errors.append((source, str(e)))
+                    else:
+                        info.compress_type = zipfile.ZIP_STORED
+                        with f_src, archive.open(info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as f_dst:
+                            shutil.copyfileobj(f_src, f_dst, COPY_BLOCK_SIZE)
+                        self.exported.append((source, entry_name))
+                    self.progress.emit(done, total)
+        except OSError as e:
+            self.errors.append((self.archive_path, str(e)))
+            self.failed = True
+
+        if self.cancelled or self.failed:
+            self.exported = []
+            try:
+                os.remove(self.archive_path)
+            except OSError:
+                pass
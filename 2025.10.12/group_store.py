@@ -0,0 +1,107 @@
+# group_store.py
+
+
+class GroupStore:
+    """角色卡的分组成员关系。
+
+    每个分组用 dict 充当按加入顺序排列的有序集合，另有 路径 -> 分组 的反向索引，
+    因此判断归属、移动和删除单张卡片都是 O(1)，批量操作与卡片数量成线性关系。
+    分组本身的顺序就是 dict 的插入顺序。
+    """
+
+    def __init__(self):
+        self._groups = {}   # 分组名 -> {路径: None}
+        self._index = {}    # 路径 -> 分组名
+
+    @classmethod
+    def from_dict(cls, groups):
+        """从配置文件中的 {分组名: [路径]} 构建；同一路径出现在多个分组时以先出现的为准。"""
+        store = cls()
+        for group_name, paths in groups.items():
+            store.add_group(group_name)
+            for path in paths:
+                store.add(path, group_name)
+        return store
+
+    def to_dict(self):
+        return {group_name: list(members) for group_name, members in self._groups.items()}
+
+    def __contains__(self, group_name):
+        return group_name in self._groups
+
+    def __len__(self):
+        return len(self._groups)
+
+    def names(self):
+        return list(self._groups)
+
+    def items(self):
+        """依次返回 (分组名, 路径列表)。"""
+        for group_name, members in self._groups.items():
+            yield group_name, list(members)
+
+    def paths(self, group_name):
+        return list(self._groups.get(group_name, ()))
+
+    def all_paths(self):
+        return self._index.keys()
+
+    def group_of(self, path):
+        return self._index.get(path)
+
+    def has_card(self, path):
+        return path in self._index
+
+    def add_group(self, group_name):
+        if group_name in self._groups:
+            return False
+        self._groups[group_name] = {}
+        return True
+
+    def rename_group(self, old_name, new_name):
+        if old_name not in self._groups or new_name in self._groups:
+            return False
+        # 重建外层 dict 以保持分组原来的顺序，成员集合本身原样沿用
+        self._groups = {new_name if name == old_name else name: members for name, members in self._groups.items()}
+        for path in self._groups[new_name]:
+            self._index[path] = new_name
+        return True
+
+    def remove_group(self, group_name):
+        """删除分组并返回其中的路径；这些路径此时不属于任何分组。"""
+        members = self._groups.pop(group_name, {})
+        for path in members:
+            del self._index[path]
+        return list(members)
+
+    def add(self, path, group_name):
+        """把路径加入分组（分组不存在时创建）；已经属于某个分组时不做任何事并返回 False。"""
+        if path in self._index:
+            return False
+        self._groups.setdefault(group_name, {})[path] = None
+        self._index[path] = group_name
+        return True
+
+    def remove(self, path):
+        """把路径移出所在分组，返回原分组名；不属于任何分组时返回 None。"""
+        group_name = self._index.pop(path, None)
+        if group_name is not None:
+            del self._groups[group_name][path]
+        return group_name
+
+    def move(self, path, new_group):
+        """把路径移到 new_group 的末尾，返回原分组名；路径不在任何分组或已在目标分组时返回 None。"""
+        old_group = self._index.get(path)
+        if old_group is None or old_group == new_group or new_group not in self._groups:
+            return None
+        del self._groups[old_group][path]
+        self._groups[new_group][path] = None
+        self._index[path] = new_group
+        return old_group
+
+    def retain(self, valid_paths):
+        """移除不在 valid_paths 中的路径，返回被移除的数量。"""
+        stale = [path for path in self._index if path not in valid_paths]
+        for path in stale:
+            self.remove(path)
+        return len(stale)
@@ -0,0 +1,83 @@
+# icon_loader.py
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtGui import QImage
+
+from card_cache import stat_key
+
+MAX_ICON_THREADS = 4
+
+
+class _IconTask(QRunnable):
+    def __init__(self, loader, path, stat):
+        super().__init__()
+        self.loader = loader
+        self.path = path
+        self.stat = stat
+        self.cancelled = False
+        # 任务对象由 IconLoader 持有，直到完成信号回到主线程
+        self.setAutoDelete(False)
+
+    def run(self):
+        image = QImage()
+        if not self.cancelled:
+            stat = self.stat or stat_key(self.path)
+            if stat is not None:
+                image = self.loader.thumbnail_cache.load_image(self.path, stat)
+        self.loader._task_finished.emit(self, image)
+
+
+class IconLoader(QObject):
+    """在独立的 QThreadPool 中加载角色列表图标，界面线程只负责把结果转成 QIcon。
+
+    后请求的任务优先级更高：视图总是先绘制当前可见的行，所以刚滚动到的行最先得到图标。
+    滚出视口的行通过 retain 取消，尚未开始的任务直接从线程池队列中撤下。
+    """
+
+    icon_loaded = Signal(str, QImage)
+    _task_finished = Signal(object, QImage)
+
+    def __init__(self, thumbnail_cache, parent=None):
+        super().__init__(parent)
+        self.thumbnail_cache = thumbnail_cache
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, min(MAX_ICON_THREADS, QThreadPool.globalInstance().maxThreadCount())))
+        self._pending = {}
+        self._tasks = set()
+        self._sequence = 0
+        self._task_finished.connect(self._on_task_finished)
+
+    def request(self, path, stat=None):
+        """请求 path 的图标；stat 为已知的 (大小, 修改时间)，省去工作线程中的一次 stat。"""
+        if path in self._pending:
+            return
+        task = _IconTask(self, path, stat)
+        self._pending[path] = task
+        self._tasks.add(task)
+        self._sequence += 1
+        self.pool.start(task, self._sequence)
+
+    def cancel(self, path):
+        task = self._pending.pop(path, None)
+        if task is not None:
+            task.cancelled = True
+            if self.pool.tryTake(task):
+                self._tasks.discard(task)
+
+    def retain(self, paths):
+        """只保留 paths 中的排队任务，其余的取消。"""
+        keep = set(paths)
+        for path in [path for path in self._pending if path not in keep]:
+            self.cancel(path)
+
+    def shutdown(self):
+        for path in list(self._pending):
+            self.cancel(path)
+        self.pool.waitForDone()
+
+    def _on_task_finished(self, task, image):
+        self._tasks.discard(task)
+        if task.cancelled or self._pending.get(task.path) is not task:
+            return
+        del self._pending[task.path]
+        self.icon_loaded.emit(task.path, image)
@@ -0,0 +1,155 @@
+# import_job.py
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PySide6.QtCore import QThread, Signal
+
+from core_utils import extract_card_summary, content_digest
+
+MAX_IMPORT_WORKERS = 8
+
+
+def allocate_destinations(filenames, directory, taken_names):
+    """为每个文件名分配 directory 中的目标路径，重名时依次加 _1、_2 … 后缀。
+
+    taken_names 是目录中已占用的文件名（小写）集合，分配出去的名字会加入其中，
+    整个过程只在内存中比较，不再对每个候选名调用 os.path.exists。
+    """
+    next_suffix = {}
+    destinations = []
+    for filename in filenames:
+        if filename.lower() in taken_names:
+            base, ext = os.path.splitext(filename)
+            i = next_suffix.get(filename.lower(), 1)
+            while f"{base}_{i}{ext}".lower() in taken_names:
+                i += 1
+            next_suffix[filename.lower()] = i + 1
+            filename = f"{base}_{i}{ext}"
+        taken_names.add(filename.lower())
+        destinations.append(os.path.join(directory, filename))
+    return destinations
+
+
+class ImportJob(QThread):
+    """在后台线程中把角色卡并行复制进工作区，并顺带解析摘要、生成缩略图。
+
+    每个文件先复制成以 "." 开头的临时文件再改名，工作区扫描和目录监视不会看到复制了一半的文件。
+    与工作区中某张卡片（或本次更早选中的文件）逐字节相同的文件直接跳过，记入 duplicates。
+    只有大小和别的文件相同时才需要计算文件摘要，工作区一侧的摘要优先取自 known_hashes，
+    新算出的放进 new_hashes 供持久化。
+    结束后（包括取消）结果留在 imported / errors / duplicates 中，由界面线程一次性登记到 DataManager。
+    """
+
+    progress = Signal(int, int)     # 已完成数量, 总数
+
+    def __init__(self, pairs, thumbnail_cache, workspace_stats=None, known_hashes=None, parent=None):
+        super().__init__(parent)
+        self.pairs = pairs                  # [(源路径, 目标路径)]
+        self.thumbnail_cache = thumbnail_cache
+        self.workspace_stats = dict(workspace_stats or {})  # {路径: (大小, 修改时间)}
+        self.known_hashes = dict(known_hashes or {})        # {路径: 文件摘要值}
+        self.imported = []                  # [(目标路径, (大小, 修改时间), 摘要, 格式)]
+        self.errors = []                    # [(源路径, 错误信息)]
+        self.duplicates = []                # [(源路径, 内容相同的已有文件)]
+        self.new_hashes = []                # [(路径, (大小, 修改时间), 文件摘要值)]
+        self.cancelled = False
+        self._source_hashes = {}
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _digest(self, path, stat):
+        content_hash = self.known_hashes.get(path)
+        if content_hash is None:
+            content_hash = content_digest(path)
+            self.known_hashes[path] = content_hash
+            self.new_hashes.append((path, stat, content_hash))
+        return content_hash
+
+    def _find_duplicates(self):
+        """找出与工作区卡片或更早的源文件内容相同的源文件，返回 {源路径: 已有文件}。"""
+        by_size = {}
+        for path, stat in self.workspace_stats.items():
+            by_size.setdefault(stat[0], []).append(path)
+        sources = []
+        for source, _ in self.pairs:
+            try:
+                st = os.stat(source)
+            except OSError:
+                continue    # 复制时会再报告这个错误
+            sources.append((source, st.st_size))
+            by_size.setdefault(st.st_size, []).append(source)
+
+        duplicates = {}
+        seen = {}           # 文件摘要值 -> 第一个出现的路径（工作区卡片在前）
+        hashed_sizes = set()
+        for source, size in sources:
+            candidates = by_size[size]
+            if len(candidates) < 2 or self.cancelled:
+                continue
+            if size not in hashed_sizes:
+                hashed_sizes.add(size)
+                for path in candidates:
+                    if path in self.workspace_stats:
+                        try:
+                            seen.setdefault(self._digest(path, self.workspace_stats[path]), path)
+                        except OSError:
+                            pass
+            try:
+                content_hash = content_digest(source)
+            except OSError:
+                continue
+            if content_hash in seen:
+                duplicates[source] = seen[content_hash]
+            else:
+                seen[content_hash] = source
+                self._source_hashes[source] = content_hash
+        return duplicates
+
+    def run(self):
+        duplicates = self._find_duplicates()
+        self.duplicates = [(source, duplicates[source]) for source, _ in self.pairs if source in duplicates]
+        pairs = [(source, dest) for source, dest in self.pairs if source not in duplicates]
+        total = len(self.pairs)
+        done = len(self.duplicates)
+        workers = min(MAX_IMPORT_WORKERS, (os.cpu_count() or 1) * 2)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self._import_one, source, dest): source for source, dest in pairs}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.errors.append((futures[future], str(e)))
+                else:
+                    if result is not None:
+                        self.imported.append(result)
+                done += 1
+                self.progress.emit(done, total)
+
+        # 按选择文件时的顺序登记，而不是按完成的先后
+        order = {dest: i for i, (_, dest) in enumerate(self.pairs)}
+        self.imported.sort(key=lambda result: order[result[0]])
+
+    def _import_one(self, source_path, dest_path):
+        if self.cancelled:
+            return None
+        temp_path = os.path.join(os.path.dirname(dest_path), f".{os.path.basename(dest_path)}.import.tmp")
+        try:
+            shutil.copy2(source_path, temp_path)
+            os.replace(temp_path, dest_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        st = os.stat(dest_path)
+        stat = (st.st_size, st.st_mtime_ns)
+        if source_path in self._source_hashes:
+            # 复制出的文件内容与源文件相同，已经算过的摘要直接记到它名下
+            self.new_hashes.append((dest_path, stat, self._source_hashes[source_path]))
+        summary, format_str = extract_card_summary(dest_path)
+        if format_str != "Invalid Image":
+            self.thumbnail_cache.load_image(dest_path, stat)
+        return dest_path, stat, summary, format_str
@@ -1,9 +1,13 @@
 # 文档5 修改后 -> 建议保存为 main.py
 import sys
-from PySide6.QtWidgets import QApplication
-from main_window import MainWindow  # 从我们新建的模块中导入MainWindow
+import multiprocessing
 
 if __name__ == '__main__':
+    # 解析角色卡的进程池在打包后的程序中也能正常启动
+    multiprocessing.freeze_support()
+    # 在 __main__ 里导入界面模块，进程池的子进程重新导入本文件时就不会加载 Qt 和 pygame
+    from PySide6.QtWidgets import QApplication
+    from main_window import MainWindow  # 从我们新建的模块中导入MainWindow
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -2,88 +2,27 @@
 
 import sys
 import os
-import shutil
-import json
 import pygame
 from PIL import Image
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QTreeWidget, QTreeWidgetItem,
+    QPushButton, QTreeView, QAbstractItemView,
     QFileDialog, QMessageBox, QInputDialog, QSplitter, QMenu,
-    QLabel, QToolButton
-)
-from PySide6.QtGui import QIcon, QPixmap, QAction, QFont
-from PySide6.QtCore import Qt, QSize, QTimer
-
-from core_utils import (
-    extract_character_data_from_png, write_character_data_to_png,
-    CARD_WORKSPACE, BOOK_WORKSPACE, CONFIG_FILE, get_base_path
+    QLabel, QToolButton, QProgressDialog, QLineEdit
 )
+from PySide6.QtGui import QAction, QFont
+from PySide6.QtCore import Qt, QTimer, QPoint
+
+from core_utils import write_character_data_to_png, CARD_WORKSPACE
+from data_manager import DataManager, DEFAULT_GROUP
+from character_model import CharacterTreeModel
+from import_job import ImportJob, allocate_destinations
+from export_job import ExportJob, ArchiveExportJob
 from detail_view import DetailWidget
 from create_card_dialog import CreateCharacterDialog
 from settings_dialog import SettingsDialog
 
-APP_DIR = get_base_path()
-
-
-class DataManager:
-    def __init__(self):
-        self.characters = {}
-        self.groups = {}
-        self.settings = {}
-        self.setup_workspace()
-        self.load_config()
-
-    def get_default_settings(self):
-        return {"font_size": 10, "background_left": "", "opacity": 100, "music_playlist": [], "music_volume": 50}
-
-    def setup_workspace(self):
-        os.makedirs(CARD_WORKSPACE, exist_ok=True)
-        os.makedirs(BOOK_WORKSPACE, exist_ok=True)
-        os.makedirs(os.path.join(APP_DIR, "assets", "backgrounds"), exist_ok=True)
-        os.makedirs(os.path.join(APP_DIR, "assets", "music"), exist_ok=True)
-        os.makedirs(os.path.join(APP_DIR, "assets", "cache"), exist_ok=True)
-
-    def load_config(self):
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
-                self.groups = config_data.get("groups", {"未分组": []})
-                self.settings = self.get_default_settings()
-                self.settings.update(config_data.get("settings", {}))
-        else:
-            self.groups = {"未分组": []}
-            self.settings = self.get_default_settings()
-
-        all_card_paths = set(self.get_workspace_cards())
-        for group in list(self.groups.keys()):
-            self.groups[group] = [p for p in self.groups[group] if p in all_card_paths]
-
-        grouped_paths = set(p for paths in self.groups.values() for p in paths)
-        ungrouped = all_card_paths - grouped_paths
-        self.groups.setdefault("未分组", []).extend(list(ungrouped))
-        self.save_config()
-
-    def save_config(self):
-        config_data = {"groups": self.groups, "settings": self.settings}
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, indent=4)
-
-    def get_workspace_cards(self):
-        return [os.path.join(CARD_WORKSPACE, f) for f in os.listdir(CARD_WORKSPACE) if f.lower().endswith('.png')]
-
-    def load_character_data(self, path):
-        if path not in self.characters:
-            data, format_str = extract_character_data_from_png(path)
-            if data:
-                self.characters[path] = {'data': data, 'format': format_str}
-            elif format_str == "Invalid Image":
-                self.characters[path] = {'data': {'name': '[图片损坏或无法读取]'}, 'format': 'Invalid'}
-            else:
-                self.characters[path] = {'data': {'name': f'[无角色数据] {os.path.basename(path)}'}, 'format': 'No Data'}
-        return self.characters.get(path)
-
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -91,6 +30,14 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("角色卡工作台")
         self.setGeometry(100, 100, 1600, 900)
         self.data_manager = DataManager()
+        self.char_model = CharacterTreeModel(self.data_manager, self)
+        self.detail_widget = None
+        self.import_job = None
+        self.export_job = None
+        self.data_manager.card_changed_on_disk.connect(self.on_card_changed_on_disk)
+        self.data_manager.cards_removed.connect(self.on_cards_removed)
+        self.data_manager.trash.expired.connect(self.on_trash_expired)
+        self.data_manager.config_store.write_failed.connect(self.on_config_write_failed)
         pygame.init()
         pygame.mixer.init()
         self.current_music_playlist = []
@@ -101,6 +48,7 @@ class MainWindow(QMainWindow):
         self.music_check_timer.start(1000)
         self.init_ui()
         self.load_initial_data()
+        self.data_manager.prune_thumbnails()
         self.apply_settings()
 
     def init_ui(self):
@@ -142,24 +90,49 @@ class MainWindow(QMainWindow):
         self.import_folder_action = QAction("一键导入文件夹", self)
         self.delete_selected_action = QAction("一键删除选中", self)
         self.export_selected_action = QAction("一键导出选中", self)
+        self.export_archive_action = QAction("导出选中为压缩包", self)
         bulk_menu.addAction(self.import_folder_action)
         bulk_menu.addAction(self.delete_selected_action)
         bulk_menu.addAction(self.export_selected_action)
+        bulk_menu.addAction(self.export_archive_action)
         self.bulk_actions_btn.setMenu(bulk_menu)
         bulk_action_layout.addWidget(self.bulk_actions_btn)
         bulk_action_layout.addStretch()
         left_layout.addLayout(bulk_action_layout)
 
-        self.char_tree = QTreeWidget()
-        self.char_tree.setHeaderLabel("角色分组")
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("搜索名称、描述、标签、世界书……")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.setEnabled(self.data_manager.search_index.enabled)
+        # 输入停顿后再搜索，连续输入时不必每个字都重建列表
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.apply_search)
+        self.search_box.textChanged.connect(lambda: self.search_timer.start())
+        self.data_manager.search_index_updated.connect(self.on_search_index_updated)
+        left_layout.addWidget(self.search_box)
+
+        self.char_tree = QTreeView()
+        self.char_tree.setModel(self.char_model)
+        # 所有行等高，视图不必逐行计算高度，滚动大列表时只处理可见区域
+        self.char_tree.setUniformRowHeights(True)
         self.char_tree.setContextMenuPolicy(Qt.CustomContextMenu)
         self.char_tree.customContextMenuRequested.connect(self.show_tree_context_menu)
-        self.char_tree.itemDoubleClicked.connect(self.open_detail_view)
+        self.char_tree.doubleClicked.connect(self.open_detail_view)
         self.char_tree.setDragEnabled(True)
         self.char_tree.setAcceptDrops(True)
         self.char_tree.setDropIndicatorShown(True)
-        self.char_tree.setDragDropMode(QTreeWidget.InternalMove)
-        self.char_tree.setSelectionMode(QTreeWidget.ExtendedSelection)
+        self.char_tree.setDragDropMode(QAbstractItemView.InternalMove)
+        self.char_tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.char_model.rowsInserted.connect(self.expand_new_groups)
+        # 滚动停下后取消已滚出视口的图标任务
+        self.icon_retain_timer = QTimer(self)
+        self.icon_retain_timer.setSingleShot(True)
+        self.icon_retain_timer.setInterval(100)
+        self.icon_retain_timer.timeout.connect(self.retain_visible_icons)
+        self.char_tree.verticalScrollBar().valueChanged.connect(lambda: self.icon_retain_timer.start())
+        self.char_tree.collapsed.connect(lambda: self.icon_retain_timer.start())
         left_layout.addWidget(self.char_tree)
 
         self.right_panel = QWidget()
@@ -173,9 +146,16 @@ class MainWindow(QMainWindow):
         splitter.setSizes([400, 1200])
         main_layout.addWidget(splitter)
 
+        # 删除后在状态栏中提供撤销，撤销窗口结束后隐藏
+        self.undo_delete_btn = QPushButton("撤销删除")
+        self.undo_delete_btn.hide()
+        self.undo_delete_btn.clicked.connect(self.undo_delete)
+        self.statusBar().addPermanentWidget(self.undo_delete_btn)
+
         self.import_folder_action.triggered.connect(self.import_folder)
         self.delete_selected_action.triggered.connect(self.delete_selected_characters)
         self.export_selected_action.triggered.connect(self.export_selected_characters)
+        self.export_archive_action.triggered.connect(self.export_selected_as_archive)
 
     def check_music_status(self):
         if self.current_music_playlist and not self.is_music_paused and not pygame.mixer.music.get_busy():
@@ -212,10 +192,9 @@ class MainWindow(QMainWindow):
 
     def export_selected_characters(self):
         """任务3：修改一键导出功能，使用角色名称作为文件名"""
-        selected_items = self.char_tree.selectedItems()
-        char_items_to_export = [item for item in selected_items if item.data(0, Qt.UserRole) != "group"]
+        char_paths_to_export = self.selected_card_paths()
 
-        if not char_items_to_export:
+        if not char_paths_to_export:
             QMessageBox.warning(self, "未选择", "请先在列表中选择要导出的角色卡。")
             return
 
@@ -223,49 +202,81 @@ class MainWindow(QMainWindow):
         if not export_dir:
             return
 
-        exported_count = 0
-        for item in char_items_to_export:
-            char_path = item.data(0, Qt.UserRole)
-            char_info = self.data_manager.load_character_data(char_path)
-
-            if not char_info:
-                QMessageBox.warning(self, "数据错误", f"无法读取角色卡数据: {char_path}")
-                continue
-
-            # 获取角色名称
-            data = char_info['data']
-            char_name = data.get("data", {}).get("name") or data.get("name", "Unnamed")
-
-            # 安全化文件名
-            safe_char_name = "".join(c for c in char_name if c.isalnum() or c in " _-").rstrip()
-            if not safe_char_name:
-                safe_char_name = "Unnamed"
+        if self.export_job is not None:
+            QMessageBox.warning(self, "正在导出", "上一次导出尚未完成，请稍后再试。")
+            return
 
-            # 使用角色名称作为文件名
-            dest_path = os.path.join(export_dir, f"{safe_char_name}.png")
+        self.start_export_job(ExportJob(char_paths_to_export, export_dir, self.known_card_names(char_paths_to_export),
+                                        self))
 
-            # 处理文件名冲突
-            if os.path.exists(dest_path):
-                base, ext = os.path.splitext(dest_path)
-                i = 1
-                while os.path.exists(dest_path):
-                    dest_path = f"{base}_{i}{ext}"
-                    i += 1
+    def export_selected_as_archive(self):
+        self.export_archive(self.selected_card_paths(), "characters")
 
-            try:
-                shutil.copy2(char_path, dest_path)
-                exported_count += 1
-            except Exception as e:
-                QMessageBox.critical(self, "导出失败", f"导出角色卡 {char_name} 时出错: {e}")
+    def export_archive(self, char_paths_to_export, default_name):
+        """把角色卡打包导出为一个 ZIP 压缩包。"""
+        if not char_paths_to_export:
+            QMessageBox.warning(self, "未选择", "请先在列表中选择要导出的角色卡。")
+            return
+        if self.export_job is not None:
+            QMessageBox.warning(self, "正在导出", "上一次导出尚未完成，请稍后再试。")
+            return
 
-        QMessageBox.information(self, "导出成功", f"成功导出 {exported_count} 张角色卡到目录: {export_dir}")
+        archive_path, _ = QFileDialog.getSaveFileName(self, "导出为压缩包", f"{default_name}.zip", "ZIP Files (*.zip)")
+        if not archive_path:
+            return
+        self.start_export_job(ArchiveExportJob(char_paths_to_export, archive_path,
+                                               self.known_card_names(char_paths_to_export), self))
+
+    def known_card_names(self, paths):
+        # 角色名称取自已在内存中的摘要，其余的由导出任务在后台解析
+        summaries = self.data_manager.summaries
+        return {path: summaries[path].name for path in paths if path in summaries}
+
+    def start_export_job(self, job):
+        self.export_job = job
+        self.export_progress = QProgressDialog("正在导出角色卡...", "取消", 0, len(job.paths), self)
+        self.export_progress.setWindowTitle("导出角色卡")
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(300)
+        self.export_progress.setAutoClose(False)
+        self.export_progress.setAutoReset(False)
+        self.export_progress.canceled.connect(self.export_job.cancel)
+        self.export_job.progress.connect(lambda done, total: self.export_progress.setValue(done))
+        self.export_job.finished.connect(self.on_export_finished)
+        self.export_job.start()
+
+    def on_export_finished(self):
+        job, self.export_job = self.export_job, None
+        # 关闭进度对话框也会发出 canceled，先记下任务是否真的被取消
+        cancelled = job.cancelled
+        self.export_progress.close()
+
+        if isinstance(job, ArchiveExportJob):
+            message = f"成功导出 {len(job.exported)} 张角色卡到压缩包: {job.archive_path}"
+        else:
+            message = f"成功导出 {len(job.exported)} 张角色卡到目录: {job.export_dir}"
+        if cancelled:
+            message = f"导出已取消，{message}"
+        if isinstance(job, ArchiveExportJob) and job.failed:
+            QMessageBox.critical(self, "导出失败", f"写入压缩包 {job.archive_path} 时出错: {job.errors[-1][1]}")
+        elif job.errors:
+            details = "\n".join(f"{os.path.basename(source)}: {error}" for source, error in job.errors[:10])
+            if len(job.errors) > 10:
+                details += f"\n……另有 {len(job.errors) - 10} 个"
+            QMessageBox.warning(self, "导出完成", f"{message}\n{len(job.errors)} 张角色卡导出失败:\n{details}")
+        else:
+            QMessageBox.information(self, "导出成功", message)
 
     def open_settings_dialog(self):
         dialog = SettingsDialog(self.data_manager.settings, self)
         if dialog.exec():
             new_settings = dialog.get_settings()
+            rescan = new_settings.get('scan_subfolders') != self.data_manager.settings.get('scan_subfolders')
             self.data_manager.settings = new_settings
+            self.data_manager.apply_cache_settings()
             self.data_manager.save_config()
+            if rescan:
+                self.data_manager.reconcile_workspace()
             self.apply_settings()
 
     def apply_settings(self):
@@ -288,7 +299,7 @@ class MainWindow(QMainWindow):
             QLabel, QPushButton, QCheckBox, QRadioButton, QSpinBox, QToolButton {{
                 background-color: transparent; color: {ui_fg_color};
             }}
-            QTreeWidget, QTextEdit, QLineEdit, QListWidget {{
+            QTreeView, QTextEdit, QLineEdit, QListWidget {{
                  background-color: rgba({ui_bg_color}, {opacity_value}); color: {ui_fg_color};
             }}
         """
@@ -366,65 +377,50 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "图片转换失败", f"无法将所选图片转换为PNG格式: {e}")
             return
 
-        success, message = write_character_data_to_png(dest_path, full_card_data)
+        success, message, _ = write_character_data_to_png(dest_path, full_card_data,
+                                                          compress_level=self.data_manager.card_compress_level())
         if success:
             QMessageBox.information(self, "成功", f"角色卡 '{card_info.get('name')}' 已成功创建!")
-            self.data_manager.groups.setdefault("未分组", []).append(dest_path)
-            self.data_manager.save_config()
-            self.load_initial_data()
+            self.data_manager.add_cards([dest_path])
         else:
             QMessageBox.critical(self, "写入失败", f"无法将角色数据写入PNG: {message}")
             os.remove(dest_path)
 
-    def handle_drop_event(self, event):
-        item = self.char_tree.itemAt(event.pos())
-        if not item:
-            return
-
-        dragged_item = self.char_tree.selectedItems()[0]
-        if dragged_item.parent() is None:
-            return
-
-        target_group_item = item if item.parent() is None else item.parent()
-        old_group_name = dragged_item.parent().text(0)
-        new_group_name = target_group_item.text(0)
-        char_path = dragged_item.data(0, Qt.UserRole)
-
-        if old_group_name != new_group_name:
-            self.data_manager.groups[old_group_name].remove(char_path)
-
-        self.data_manager.groups[new_group_name].append(char_path)
-        self.data_manager.save_config()
-
-        dragged_item.parent().removeChild(dragged_item)
-        target_group_item.addChild(dragged_item)
-
     def load_initial_data(self):
-        """任务2：修改左侧角色卡显示名称，移除格式后缀"""
-        self.char_tree.clear()
-
-        for group_name, paths in self.data_manager.groups.items():
-            group_item = QTreeWidgetItem(self.char_tree, [group_name])
-            group_item.setData(0, Qt.UserRole, "group")
-
-            for path in paths:
-                char_info = self.data_manager.load_character_data(path)
-                if char_info:
-                    data = char_info['data']
-                    format_str = char_info['format']
-
-                    # 只显示角色名称，不显示格式信息
-                    display_name = data.get("data", {}).get("name") or data.get("name", "未知名称")
-
-                    char_item = QTreeWidgetItem(group_item, [display_name])
-                    char_item.setData(0, Qt.UserRole, path)
-
-                    if format_str != "Invalid":
-                        pixmap = QPixmap(path)
-                        icon = QIcon(pixmap.scaled(QSize(64, 64), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-                        char_item.setIcon(0, icon)
-
-            group_item.setExpanded(True)
+        """按当前分组重建角色列表模型，只在启动时调用；之后的改动都由 DataManager 的信号局部更新。"""
+        self.char_model.reload()
+        self.char_tree.expandAll()
+
+    def expand_new_groups(self, parent, first, last):
+        if not parent.isValid():
+            for row in range(first, last + 1):
+                self.char_tree.expand(self.char_model.index(row, 0))
+
+    def visible_card_paths(self):
+        paths = []
+        viewport_height = self.char_tree.viewport().height()
+        index = self.char_tree.indexAt(QPoint(0, 0))
+        while index.isValid() and self.char_tree.visualRect(index).top() < viewport_height:
+            if index.data(Qt.UserRole) != "group":
+                paths.append(index.data(Qt.UserRole))
+            index = self.char_tree.indexBelow(index)
+        return paths
+
+    def retain_visible_icons(self):
+        self.char_model.retain_icons(self.visible_card_paths())
+
+    def apply_search(self):
+        if self.char_model.set_filter(self.data_manager.search(self.search_box.text())):
+            self.char_tree.expandAll()
+
+    def on_search_index_updated(self):
+        # 后台补全的索引可能让更多卡片匹配当前的搜索；结果不变时 set_filter 不会重置列表
+        if self.search_box.text().strip():
+            self.apply_search()
+
+    def selected_card_paths(self):
+        return [index.data(Qt.UserRole) for index in self.char_tree.selectionModel().selectedRows()
+                if index.data(Qt.UserRole) != "group"]
 
     def import_files(self):
         original_paths, _ = QFileDialog.getOpenFileNames(self, "选择角色卡", "", "PNG Files (*.png)")
@@ -444,136 +440,212 @@ class MainWindow(QMainWindow):
         self.copy_files_to_workspace(png_files)
 
     def copy_files_to_workspace(self, file_paths):
-        imported_count = 0
-        for original_path in file_paths:
-            filename = os.path.basename(original_path)
-            dest_path = os.path.join(CARD_WORKSPACE, filename)
-
-            if os.path.exists(dest_path):
-                base, ext = os.path.splitext(filename)
-                i = 1
-                while os.path.exists(dest_path):
-                    dest_path = os.path.join(CARD_WORKSPACE, f"{base}_{i}{ext}")
-                    i += 1
-
-            shutil.copy2(original_path, dest_path)
-            self.data_manager.groups.setdefault("未分组", []).append(dest_path)
-            imported_count += 1
-
-        if imported_count > 0:
-            self.data_manager.save_config()
-            self.load_initial_data()
-            QMessageBox.information(self, "导入成功", f"成功导入 {imported_count} 张角色卡。")
+        """在后台并行复制角色卡，完成（或取消）后一次性加入"未分组"。"""
+        if self.import_job is not None:
+            QMessageBox.warning(self, "正在导入", "上一次导入尚未完成，请稍后再试。")
+            return
+
+        taken_names = {name.lower() for name in os.listdir(CARD_WORKSPACE)}
+        destinations = allocate_destinations([os.path.basename(path) for path in file_paths], CARD_WORKSPACE,
+                                             taken_names)
+        self.data_manager.pending_imports.update(destinations)
+
+        self.import_job = ImportJob(list(zip(file_paths, destinations)), self.data_manager.thumbnail_cache,
+                                    self.data_manager.file_stats, self.data_manager.known_content_hashes(), self)
+        self.import_progress = QProgressDialog("正在导入角色卡...", "取消", 0, len(file_paths), self)
+        self.import_progress.setWindowTitle("导入角色卡")
+        self.import_progress.setWindowModality(Qt.WindowModal)
+        self.import_progress.setMinimumDuration(300)
+        self.import_progress.setAutoClose(False)
+        self.import_progress.setAutoReset(False)
+        self.import_progress.canceled.connect(self.import_job.cancel)
+        self.import_job.progress.connect(lambda done, total: self.import_progress.setValue(done))
+        self.import_job.finished.connect(self.on_import_finished)
+        self.import_job.start()
+
+    def on_import_finished(self):
+        job, self.import_job = self.import_job, None
+        # 关闭进度对话框也会发出 canceled，先记下任务是否真的被取消
+        cancelled = job.cancelled
+        self.import_progress.close()
+        payload_duplicates = self.data_manager.commit_import(job.imported, [dest for _, dest in job.pairs],
+                                                             job.new_hashes)
+
+        message = f"成功导入 {len(job.imported)} 张角色卡。"
+        if cancelled:
+            message = f"导入已取消，{message}"
+        if job.duplicates:
+            message += f"\n跳过 {len(job.duplicates)} 个与工作区中已有文件完全相同的文件。"
+        if payload_duplicates:
+            details = "\n".join(
+                f"{os.path.basename(path)} ↔ {', '.join(os.path.basename(other) for other in others)}"
+                for path, others in payload_duplicates[:10]
+            )
+            message += f"\n{len(payload_duplicates)} 张卡片的角色数据与已有卡片相同（图片不同）:\n{details}"
+        if job.errors:
+            details = "\n".join(f"{os.path.basename(source)}: {error}" for source, error in job.errors[:10])
+            QMessageBox.warning(self, "导入完成", f"{message}\n{len(job.errors)} 个文件导入失败:\n{details}")
+        elif job.imported or job.duplicates or cancelled:
+            QMessageBox.information(self, "导入成功", message)
 
     def add_group(self):
         text, ok = QInputDialog.getText(self, '添加分组', '请输入新的分组名称:')
-        if ok and text and text not in self.data_manager.groups:
-            self.data_manager.groups[text] = []
-            self.data_manager.save_config()
-            self.load_initial_data()
+        if ok and text:
+            self.data_manager.add_group(text)
 
     def show_tree_context_menu(self, position):
-        item = self.char_tree.itemAt(position)
-        if not item:
+        index = self.char_tree.indexAt(position)
+        if not index.isValid():
             return
 
         menu = QMenu()
-        item_type = item.data(0, Qt.UserRole)
+        item_type = index.data(Qt.UserRole)
 
         if item_type == "group":
+            group_name = index.data(Qt.DisplayRole)
             rename_action = QAction("重命名分组", self)
             delete_action = QAction("删除分组", self)
-            rename_action.triggered.connect(lambda: self.rename_group(item))
-            delete_action.triggered.connect(lambda: self.delete_group(item))
+            export_action = QAction("导出分组为压缩包", self)
+            rename_action.triggered.connect(lambda: self.rename_group(group_name))
+            delete_action.triggered.connect(lambda: self.delete_group(group_name))
+            export_action.triggered.connect(
+                lambda: self.export_archive(self.data_manager.groups.paths(group_name), group_name))
             menu.addAction(rename_action)
-            if item.text(0) != "未分组" and item.childCount() == 0:
+            if self.char_model.hasChildren(index):
+                menu.addAction(export_action)
+            if group_name != DEFAULT_GROUP and not self.char_model.hasChildren(index):
                 menu.addAction(delete_action)
         else:
             delete_action = QAction("删除角色卡", self)
-            delete_action.triggered.connect(lambda: self.delete_character(item))
+            delete_action.triggered.connect(lambda: self.delete_character(item_type))
             menu.addAction(delete_action)
 
-        menu.exec(self.char_tree.mapToGlobal(position))
+        menu.exec(self.char_tree.viewport().mapToGlobal(position))
 
-    def rename_group(self, item):
-        old_name = item.text(0)
+    def rename_group(self, old_name):
         new_name, ok = QInputDialog.getText(self, "重命名分组", "新名称:", text=old_name)
-        if ok and new_name and new_name != old_name and new_name not in self.data_manager.groups:
-            self.data_manager.groups[new_name] = self.data_manager.groups.pop(old_name)
-            self.data_manager.save_config()
-            item.setText(0, new_name)
+        if ok and new_name:
+            self.data_manager.rename_group(old_name, new_name)
 
-    def delete_group(self, item):
-        group_name = item.text(0)
+    def delete_group(self, group_name):
         reply = QMessageBox.question(self, "确认删除", f"确定要删除分组 '{group_name}' 吗?(角色卡将移至'未分组')")
         if reply == QMessageBox.Yes:
-            paths = self.data_manager.groups.pop(group_name, [])
-            self.data_manager.groups.setdefault("未分组", []).extend(paths)
-            self.data_manager.save_config()
-            self.load_initial_data()
+            self.data_manager.remove_group(group_name)
 
-    def delete_character(self, item):
-        char_path = item.data(0, Qt.UserRole)
-        char_name = item.text(0)
-        reply = QMessageBox.question(self, "确认删除", f"确定要删除角色 '{char_name}' 吗?\n这将从工作区永久删除文件。")
+    def delete_character(self, char_path):
+        char_name = self.data_manager.load_summary(char_path).name
+        reply = QMessageBox.question(self, "确认删除", f"确定要删除角色 '{char_name}' 吗?\n文件将移入回收站，短时间内可以撤销。")
         if reply == QMessageBox.Yes:
-            self.delete_card_logic([item])
+            self.delete_card_logic([char_path])
 
     def delete_selected_characters(self):
-        selected_items = self.char_tree.selectedItems()
-        char_items_to_delete = [item for item in selected_items if item.data(0, Qt.UserRole) != "group"]
+        char_paths_to_delete = self.selected_card_paths()
 
-        if not char_items_to_delete:
+        if not char_paths_to_delete:
             QMessageBox.warning(self, "未选择", "请先在列表中选择要删除的角色卡。")
             return
 
-        reply = QMessageBox.question(self, "确认删除", f"确定要删除选中的 {len(char_items_to_delete)} 张角色卡吗?\n这将从工作区永久删除文件。")
+        reply = QMessageBox.question(self, "确认删除", f"确定要删除选中的 {len(char_paths_to_delete)} 张角色卡吗?\n文件将移入回收站，短时间内可以撤销。")
         if reply == QMessageBox.Yes:
-            self.delete_card_logic(char_items_to_delete)
+            self.delete_card_logic(char_paths_to_delete)
 
-    def delete_card_logic(self, items_to_delete):
-        for item in items_to_delete:
-            char_path = item.data(0, Qt.UserRole)
-            group_name = item.parent().text(0)
-
-            if char_path in self.data_manager.groups.get(group_name, []):
-                self.data_manager.groups[group_name].remove(char_path)
+    def delete_card_logic(self, char_paths):
+        # 文件移入回收站，列表中的行由 cards_removed 信号局部移除
+        try:
+            _, deleted_paths, errors = self.data_manager.trash_cards(char_paths)
+        except OSError as e:
+            QMessageBox.critical(self, "删除失败", f"无法创建回收站目录: {e}")
+            return
 
-            self.data_manager.characters.pop(char_path, None)
+        if deleted_paths:
+            self.statusBar().showMessage(f"已删除 {len(deleted_paths)} 张角色卡。", self.data_manager.trash.undo_window_ms)
+            self.undo_delete_btn.show()
+        if errors:
+            details = "\n".join(f"{os.path.basename(path)}: {error}" for path, error in errors[:10])
+            QMessageBox.warning(self, "删除失败", f"{len(errors)} 张角色卡无法删除:\n{details}")
 
-            try:
-                if os.path.exists(char_path):
-                    os.remove(char_path)
-            except OSError as e:
-                QMessageBox.critical(self, "删除失败", f"无法删除文件: {char_path}\n错误: {e}")
-                continue
+    def undo_delete(self):
+        batch_id = self.data_manager.trash.last_batch()
+        if batch_id is None:
+            return
+        restored, failed = self.data_manager.restore_trashed(batch_id)
+        self.statusBar().showMessage(f"已还原 {len(restored)} 张角色卡。", 5000)
+        if failed:
+            QMessageBox.warning(self, "部分未还原", f"{len(failed)} 张角色卡的原位置已有同名文件，未能还原。")
 
-            if item.parent():
-                item.parent().removeChild(item)
+    def on_config_write_failed(self, message):
+        QMessageBox.warning(self, "保存失败", f"无法写入配置文件，分组和设置的修改尚未保存:\n{message}")
 
-        self.data_manager.save_config()
-        QMessageBox.information(self, "删除成功", f"已成功删除 {len(items_to_delete)} 张角色卡。")
+    def on_trash_expired(self, batch_id):
+        if self.data_manager.trash.last_batch() is None:
+            self.undo_delete_btn.hide()
 
-    def open_detail_view(self, item):
-        item_data = item.data(0, Qt.UserRole)
+    def open_detail_view(self, index):
+        item_data = index.data(Qt.UserRole)
         if item_data == "group" or not isinstance(item_data, str):
             return
 
-        char_path = item_data
-        char_info = self.data_manager.load_character_data(char_path)
+        char_info = self.data_manager.load_character_data(item_data)
 
         if not char_info or char_info['format'] == 'Invalid':
             QMessageBox.warning(self, "无法打开", "此文件无法读取或不包含有效的角色数据。")
             return
 
+        self.show_detail(item_data, char_info)
+
+    def clear_right_panel(self):
         for i in reversed(range(self.right_layout.count())):
             widget_to_remove = self.right_layout.itemAt(i).widget()
             if widget_to_remove:
                 widget_to_remove.setParent(None)
 
+    def show_detail(self, char_path, char_info):
+        self.clear_right_panel()
         self.detail_widget = DetailWidget(char_path, char_info, self.data_manager, self)
         self.right_layout.addWidget(self.detail_widget)
+        # 打开的卡片被其他程序原地改写时目录事件不会触发，单独监视这个文件
+        self.data_manager.workspace_watcher.watch_file(char_path)
+
+    def close_detail(self):
+        self.clear_right_panel()
+        self.detail_widget = None
+        self.data_manager.workspace_watcher.watch_file(None)
+        self.right_layout.addWidget(QLabel("双击左侧角色以查看/编辑详情"))
+
+    def on_card_changed_on_disk(self, char_path):
+        if self.detail_widget is None or self.detail_widget.char_path != char_path:
+            return
+        char_info = self.data_manager.load_character_data(char_path)
+        valid = char_info and char_info['format'] != 'Invalid'
+        # 详情页中有未保存的修改时先询问，用户选择保留时不动当前界面，之后仍可保存或另行导出
+        if self.detail_widget.modified:
+            question = ("该角色卡已被其他程序修改，是否重新加载？" if valid
+                        else "该角色卡已被其他程序修改，且无法再读取角色数据，是否关闭详情页？")
+            reply = QMessageBox.question(self, "文件已在外部修改", f"{question}\n当前未保存的修改将会丢失。")
+            if reply != QMessageBox.Yes:
+                return
+            if self.detail_widget is None or self.detail_widget.char_path != char_path:
+                return
+        if valid:
+            self.show_detail(char_path, char_info)
+        else:
+            self.close_detail()
+
+    def on_cards_removed(self, paths, group_name):
+        if self.detail_widget is not None and self.detail_widget.char_path in paths:
+            self.close_detail()
 
     def closeEvent(self, event):
+        if self.export_job is not None:
+            self.export_job.cancel()
+            self.export_job.wait()
+        if self.import_job is not None:
+            # 已经复制完成的卡片照常登记，其余的放弃
+            self.import_job.cancel()
+            self.import_job.wait()
+            self.data_manager.commit_import(self.import_job.imported, [dest for _, dest in self.import_job.pairs],
+                                            self.import_job.new_hashes)
+        self.char_model.icon_loader.shutdown()
+        self.data_manager.close()
         pygame.quit()
         event.accept()
\ No newline at end of file
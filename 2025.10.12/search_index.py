@@ -0,0 +1,235 @@
+# search_index.py
+
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from PySide6.QtCore import QThread
+
+from core_utils import extract_character_data_from_png, PROCESS_POOL_THRESHOLD
+
+INDEX_BATCH_SIZE = 64
+TEXT_FIELDS = ('name', 'description', 'personality', 'scenario', 'first_mes', 'creator')
+
+# 中日韩文字没有空格分词，按相邻两字切分；其余文字按单词切分
+_CJK_RANGES = '぀-ヿ㐀-䶿一-鿿豈-﫿가-힯'
+_TOKEN_RE = re.compile(f'([{_CJK_RANGES}]+)|([^\\W_{_CJK_RANGES}]+)')
+
+
+def tokenize(text):
+    """把文本切成索引用的词：单词转小写，中日韩文字切成相邻两字，另加每段的最后一个字。
+
+    最后一个字单独成词，是为了让任意单字都能作为某个词的前缀被搜到。
+    """
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(text):
+        if word:
+            tokens.append(word.lower())
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            tokens.append(cjk[-1])
+    return tokens
+
+
+def _query_terms(query):
+    """把搜索框中的文字转成 FTS5 查询，所有词都要出现；没有可搜索的词时返回 None。"""
+    terms = []
+    for cjk, word in _TOKEN_RE.findall(query):
+        if word:
+            terms.append(f'"{word.lower()}"*')
+        elif len(cjk) == 1:
+            terms.append(f'"{cjk}"*')
+        else:
+            terms.extend(f'"{cjk[i:i + 2]}"' for i in range(len(cjk) - 1))
+    return " AND ".join(terms) or None
+
+
+def card_text(data):
+    """取出角色卡中参与搜索的文字：基本字段、标签以及内嵌世界书条目的关键词和内容，返回分好词的文本。"""
+    if not isinstance(data, dict):
+        return ""
+    inner = data.get('data')
+    if not isinstance(inner, dict):
+        inner = data
+    parts = [str(inner.get(field) or data.get(field) or '') for field in TEXT_FIELDS]
+    tags = inner.get('tags') or data.get('tags')
+    if isinstance(tags, list):
+        parts.extend(str(tag) for tag in tags)
+    book = inner.get('character_book')
+    if isinstance(book, dict) and isinstance(book.get('entries'), list):
+        for entry in book['entries']:
+            if not isinstance(entry, dict):
+                continue
+            keys = entry.get('keys')
+            if isinstance(keys, list):
+                parts.extend(str(key) for key in keys)
+            parts.append(str(entry.get('content') or ''))
+    return " ".join(tokenize(" ".join(parts)))
+
+
+def _index_batch(items):
+    """解析一批角色卡并分词，返回 [(路径, (大小, 修改时间), 文本)]；在工作进程或线程中执行。"""
+    results = []
+    for path, stat in items:
+        try:
+            data, _ = extract_character_data_from_png(path)
+        except Exception:
+            data = None
+        # 无法解析的卡片也登记一条空记录，避免每次都重新尝试
+        results.append((path, stat, card_text(data)))
+    return results
+
+
+def _is_missing_fts5(error):
+    return "no such module: fts5" in str(error).lower()
+
+
+class SearchIndex:
+    """角色卡全文搜索的倒排索引，保存在 SQLite FTS5 中。
+
+    分词在 Python 中完成（见 tokenize），FTS5 只负责按空格分隔的词建立倒排表，因此中文也能按词搜索。
+    docs 表记下每张卡片索引时的大小和修改时间，两者任一变化即需要重新索引。
+    所用的 SQLite 不支持 FTS5 时 enabled 为 False，搜索不可用，其余方法什么也不做。
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.enabled = True
+        try:
+            self.conn = self._open()
+        except sqlite3.OperationalError as e:
+            # 只有缺少 FTS5 模块才退化为不可搜索；数据库被锁定之类的错误照常抛出
+            if not _is_missing_fts5(e):
+                raise
+            self.enabled = False
+            self.conn = None
+        except sqlite3.DatabaseError:
+            # 索引文件损坏时直接丢弃重建，内容都可以从角色卡重新生成
+            os.remove(db_path)
+            self.conn = self._open()
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS docs")
+                conn.execute("DROP TABLE IF EXISTS terms")
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS docs (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                )
+            """)
+            # 每个词都是单独的短语，不需要位置信息；单字和两字前缀另建索引，输入一两个字时也能直接查到
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS terms
+                USING fts5(body, detail=none, prefix='1 2', tokenize='unicode61 remove_diacritics 0')
+            """)
+            conn.commit()
+        except sqlite3.DatabaseError:
+            conn.close()
+            raise
+        return conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+    def stale(self, stats):
+        """stats 为 {路径: (大小, 修改时间)}，返回其中尚未索引或索引已过期的路径。"""
+        if not self.enabled:
+            return []
+        indexed = {path: (size, mtime_ns) for path, size, mtime_ns in
+                   self.conn.execute("SELECT path, size, mtime_ns FROM docs")}
+        return [path for path, stat in stats.items() if indexed.get(path) != stat]
+
+    def put(self, entries):
+        """entries 为 [(路径, (大小, 修改时间), 分好词的文本)]，在一个事务中写入。"""
+        if not self.enabled:
+            return
+        with self.conn:
+            for path, stat, body in entries:
+                row = self.conn.execute("SELECT id FROM docs WHERE path = ?", (path,)).fetchone()
+                if row is None:
+                    doc_id = self.conn.execute("INSERT INTO docs (path, size, mtime_ns) VALUES (?, ?, ?)",
+                                               (path, stat[0], stat[1])).lastrowid
+                else:
+                    doc_id = row[0]
+                    self.conn.execute("UPDATE docs SET size = ?, mtime_ns = ? WHERE id = ?", (stat[0], stat[1], doc_id))
+                    self.conn.execute("DELETE FROM terms WHERE rowid = ?", (doc_id,))
+                self.conn.execute("INSERT INTO terms (rowid, body) VALUES (?, ?)", (doc_id, body))
+
+    def remove(self, paths):
+        if not self.enabled:
+            return
+        with self.conn:
+            for path in paths:
+                row = self.conn.execute("SELECT id FROM docs WHERE path = ?", (path,)).fetchone()
+                if row is not None:
+                    self.conn.execute("DELETE FROM terms WHERE rowid = ?", row)
+                    self.conn.execute("DELETE FROM docs WHERE id = ?", row)
+
+    def prune(self, valid_paths):
+        """删除工作区中已不存在的角色卡的索引。"""
+        if not self.enabled:
+            return
+        stale = [path for (path,) in self.conn.execute("SELECT path FROM docs") if path not in valid_paths]
+        if stale:
+            self.remove(stale)
+
+    def search(self, query):
+        """返回包含 query 中所有词的角色卡路径集合；query 中没有可搜索的词时返回 None。"""
+        if not self.enabled:
+            return None
+        match = _query_terms(query)
+        if match is None:
+            return None
+        rows = self.conn.execute(
+            "SELECT docs.path FROM terms JOIN docs ON docs.id = terms.rowid WHERE terms MATCH ?", (match,)
+        )
+        return {path for (path,) in rows}
+
+
+class IndexJob(QThread):
+    """在后台为一批角色卡建立或更新索引，使用自己的数据库连接。
+
+    卡片较多时（首次建立索引）在进程池中解析和分词，工作进程只传回分好词的文本；
+    每批写入一个事务，界面线程中的搜索不会被长时间阻塞。
+    """
+
+    def __init__(self, db_path, items, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.items = items          # [(路径, (大小, 修改时间))]
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        index = SearchIndex(self.db_path)
+        try:
+            workers = os.cpu_count() or 1
+            use_processes = workers > 1 and len(self.items) >= PROCESS_POOL_THRESHOLD
+            executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            batches = [self.items[i:i + INDEX_BATCH_SIZE] for i in range(0, len(self.items), INDEX_BATCH_SIZE)]
+            # 每轮只提交有限的几批，内存中不会积压大量解析结果，取消也能尽快生效
+            round_size = workers * 2
+            with executor_class(max_workers=workers) as executor:
+                for start in range(0, len(batches), round_size):
+                    if self.cancelled:
+                        break
+                    for entries in executor.map(_index_batch, batches[start:start + round_size]):
+                        index.put(entries)
+        finally:
+            index.close()
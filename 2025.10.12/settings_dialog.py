@@ -2,7 +2,7 @@ import os
 from PySide6.QtWidgets import (
     QDialog, QDialogButtonBox, QVBoxLayout, QTabWidget, QWidget,
     QFormLayout, QSpinBox, QSlider, QLabel, QPushButton, QFileDialog,
-    QHBoxLayout, QListWidget, QListWidgetItem, QGroupBox
+    QHBoxLayout, QListWidget, QListWidgetItem, QGroupBox, QCheckBox
 )
 from PySide6.QtCore import Qt, QUrl
 
@@ -48,6 +48,21 @@ class SettingsDialog(QDialog):
         opacity_layout.addWidget(self.opacity_slider)
         opacity_layout.addWidget(self.opacity_label)
         form_layout.addRow("UI不透明度:", opacity_layout)
+        self.compress_level_spinbox = QSpinBox()
+        self.compress_level_spinbox.setRange(0, 9)
+        self.compress_level_spinbox.setSpecialValueText("不压缩")
+        self.compress_level_spinbox.setToolTip("以 zTXt 压缩保存角色数据，等级越高文件越小、保存越慢。\n"
+                                               "部分只识别 tEXt 的工具可能无法读取压缩后的角色卡。")
+        form_layout.addRow("角色卡压缩等级:", self.compress_level_spinbox)
+        self.payload_cache_spinbox = QSpinBox()
+        self.payload_cache_spinbox.setRange(16, 8192)
+        self.payload_cache_spinbox.setSingleStep(64)
+        self.payload_cache_spinbox.setSuffix(" MB")
+        self.payload_cache_spinbox.setToolTip("内存中最多保留多少完整角色数据，超出后最久未打开的角色卡会被释放，\n"
+                                              "再次打开时重新读取。")
+        form_layout.addRow("角色数据内存缓存:", self.payload_cache_spinbox)
+        self.scan_subfolders_checkbox = QCheckBox("包含工作区中的子文件夹")
+        form_layout.addRow("角色卡扫描:", self.scan_subfolders_checkbox)
         layout.addWidget(general_group)
 
         background_group = QGroupBox("背景图片设置")
@@ -139,6 +154,9 @@ class SettingsDialog(QDialog):
         self.font_size_spinbox.setValue(self.settings.get('font_size', 10))
         self.opacity_slider.setValue(self.settings.get('opacity', 100))
         self.opacity_label.setText(f"{self.settings.get('opacity', 100)}%")
+        self.compress_level_spinbox.setValue(self.settings.get('card_compress_level', 0))
+        self.payload_cache_spinbox.setValue(self.settings.get('payload_cache_mb', 256))
+        self.scan_subfolders_checkbox.setChecked(self.settings.get('scan_subfolders', False))
 
         def update_label(label_widget, bg_path):
             if bg_path and os.path.exists(bg_path):
@@ -162,5 +180,8 @@ class SettingsDialog(QDialog):
         playlist = [self.music_list_widget.item(i).data(Qt.UserRole) for i in range(self.music_list_widget.count())]
         self.settings['font_size'] = self.font_size_spinbox.value()
         self.settings['opacity'] = self.opacity_slider.value()
+        self.settings['card_compress_level'] = self.compress_level_spinbox.value()
+        self.settings['payload_cache_mb'] = self.payload_cache_spinbox.value()
+        self.settings['scan_subfolders'] = self.scan_subfolders_checkbox.isChecked()
         self.settings['music_playlist'] = playlist
         return self.settings
\ No newline at end of file
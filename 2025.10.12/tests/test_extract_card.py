@@ -0,0 +1,35 @@
+# tests/test_extract_card.py
+
+import base64
+import os
+import sys
+
+from PIL import Image, PngImagePlugin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core_utils import extract_card_summary, extract_character_data_from_png, extract_many
+
+
+def _write_card(path, chara_text):
+    info = PngImagePlugin.PngInfo()
+    info.add_text('chara', chara_text)
+    Image.new('RGB', (8, 8)).save(path, pnginfo=info)
+
+
+def test_non_object_chara_payload_is_treated_as_no_card_data(tmp_path):
+    base64_list = str(tmp_path / "base64_list.png")
+    raw_list = str(tmp_path / "raw_list.png")
+    good = str(tmp_path / "good.png")
+    _write_card(base64_list, base64.b64encode(b'[1,2,3]').decode('ascii'))
+    _write_card(raw_list, '["data", 1]')
+    _write_card(good, base64.b64encode('{"name": "小红帽"}'.encode('utf-8')).decode('ascii'))
+
+    for path in (base64_list, raw_list):
+        assert extract_card_summary(path)[0] is None
+        assert extract_character_data_from_png(path)[0] is None
+
+    # 一张坏卡片不能让整批解析失败
+    results = {path: summary for path, summary, _ in extract_many([base64_list, raw_list, good], summary_only=True)}
+    assert results[base64_list] is None and results[raw_list] is None
+    assert results[good].name == "小红帽"
@@ -0,0 +1,31 @@
+# tests/test_json_dumps.py
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core_utils
+from core_utils import json_dumps, json_loads, payload_digest
+
+CARD_DATA = {'spec': 'chara_card_v2', 'data': {'name': '小红帽', 'extensions': {'depth': 1e-07, 'weight': 0.1}}}
+
+
+def test_non_finite_floats_are_not_written_as_null(monkeypatch):
+    data = {'a': float('nan'), 'b': [float('inf'), None], 'c': -float('inf')}
+    with_orjson = json_dumps(data)
+    monkeypatch.setattr(core_utils, 'orjson', None)
+    assert with_orjson == json_dumps(data)
+    parsed = json_loads(with_orjson)
+    assert math.isnan(parsed['a'])
+    assert parsed['b'] == [float('inf'), None]
+    assert parsed['c'] == -float('inf')
+
+
+def test_payload_digest_does_not_depend_on_backend(monkeypatch):
+    digest = payload_digest(CARD_DATA)
+    assert json_loads(json_dumps(CARD_DATA)) == CARD_DATA
+    monkeypatch.setattr(core_utils, 'orjson', None)
+    assert payload_digest(CARD_DATA) == digest
+    assert json_loads(json_dumps(CARD_DATA)) == CARD_DATA
@@ -0,0 +1,49 @@
+# tests/test_payload_digest.py
+
+import base64
+import json
+import os
+import shutil
+import sys
+
+from PIL import Image, PngImagePlugin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core_utils import extract_card_summary, extract_character_data_from_png, write_character_data_to_png
+from card_cache import CardCache, stat_key
+from data_manager import DataManager
+
+CARD_DATA = {'spec': 'chara_card_v2', 'spec_version': '2.0',
+             'data': {'name': '小红帽', 'description': '住在森林里的女孩', 'tags': ['童话']}}
+
+
+def _write_card(path, color, chara_text):
+    info = PngImagePlugin.PngInfo()
+    info.add_text('chara', base64.b64encode(chara_text.encode('utf-8')).decode('ascii'))
+    Image.new('RGB', (8, 8), color).save(path, pnginfo=info)
+
+
+def test_opened_and_saved_card_still_matches_duplicate_import(tmp_path):
+    cache = CardCache(str(tmp_path / "cache" / "cards.sqlite3"))
+    original = str(tmp_path / "original.png")
+    sibling = str(tmp_path / "sibling.png")
+    # 两张卡片的角色数据相同，但文本块的写法不同（缩进），图片也不同
+    _write_card(original, (255, 0, 0), json.dumps(CARD_DATA, ensure_ascii=False, indent=2))
+    _write_card(sibling, (0, 255, 0), json.dumps(CARD_DATA, ensure_ascii=False))
+    sibling_summary, _ = extract_card_summary(sibling)
+    cache.put_summaries([(sibling, stat_key(sibling), sibling_summary)])
+
+    # 在详情页中打开并保存 original，缓存中的摘要值改由保存时的数据计算
+    data, format_str = extract_character_data_from_png(original)
+    write_character_data_to_png(original, data)
+    cache.put_payload(original, stat_key(original), DataManager._summary_from_data(data, format_str), data)
+
+    # 再导入一份 original 的副本
+    duplicate = str(tmp_path / "duplicate.png")
+    shutil.copy(original, duplicate)
+    summary, _ = extract_card_summary(duplicate)
+    stats = {path: stat_key(path) for path in (original, sibling)}
+    found = cache.find_payload_duplicates({summary.payload_digest}, stats)
+    assert sorted(found.get(summary.payload_digest, [])) == sorted([original, sibling])
+    cache.close()
@@ -0,0 +1,61 @@
+# tests/test_write_card.py
+
+import errno
+import os
+import sys
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core_utils
+from core_utils import extract_card_summary, extract_character_data_from_png, write_character_data_to_png
+from data_manager import DataManager
+
+SHORT_CARD = {'spec': 'chara_card_v2', 'data': {'name': '小红帽'}}
+LONG_CARD = {'spec': 'chara_card_v2', 'data': {'name': '小红帽', 'description': '住在森林里的女孩' * 200}}
+
+
+def _saved_card(tmp_path):
+    path = str(tmp_path / "card.png")
+    Image.new('RGB', (8, 8), (255, 0, 0)).save(path)
+    assert write_character_data_to_png(path, SHORT_CARD)[0]
+    return path
+
+
+def test_growing_tail_is_patched_in_place(tmp_path):
+    path = _saved_card(tmp_path)
+    inode = os.stat(path).st_ino
+    assert write_character_data_to_png(path, LONG_CARD)[0]
+    assert os.stat(path).st_ino == inode
+    assert extract_character_data_from_png(path) == (LONG_CARD, "TavernAI V2")
+
+
+def test_failed_reservation_falls_back_to_replacing_the_file(tmp_path, monkeypatch):
+    path = _saved_card(tmp_path)
+    size = os.path.getsize(path)
+    overwritten = []
+
+    def no_space(f, old_size, new_size):
+        # 预留失败时原文件的字节不能被改动过
+        overwritten.append(os.path.getsize(path) != size or
+                           extract_character_data_from_png(path) != (SHORT_CARD, "TavernAI V2"))
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(core_utils, '_reserve_file_space', no_space)
+    assert write_character_data_to_png(path, LONG_CARD)[0]
+    assert overwritten == [False]
+    assert extract_character_data_from_png(path) == (LONG_CARD, "TavernAI V2")
+    assert [name for name in os.listdir(tmp_path) if name.startswith('.')] == []
+
+
+def test_saved_card_summary_matches_the_written_chunk(tmp_path):
+    # V3 卡片保存后只剩 V2 的 chara 块；压缩写入时大小也要与重新解析文件得到的一致
+    path = _saved_card(tmp_path)
+    data = dict(LONG_CARD, spec='chara_card_v3')
+    success, _, payload_size = write_character_data_to_png(path, data, compress_level=6)
+    assert success
+    summary = DataManager._summary_from_data(data, "TavernAI V2", payload_size)
+    parsed, format_str = extract_card_summary(path)
+    assert format_str == "TavernAI V2"
+    assert parsed.to_dict() == summary.to_dict()
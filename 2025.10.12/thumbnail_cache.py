@@ -0,0 +1,67 @@
+# thumbnail_cache.py
+
+import os
+import hashlib
+import threading
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage, QImageReader
+
+THUMBNAIL_SIZE = 64
+
+
+class ThumbnailCache:
+    """角色列表缩略图的磁盘缓存。
+
+    缩略图保存在 cache_dir 下，文件名是 (路径, 大小, 修改时间) 的哈希，
+    原图被修改后自然对应到新的文件名，旧文件由 prune 清理。
+    """
+
+    def __init__(self, cache_dir, size=THUMBNAIL_SIZE):
+        self.cache_dir = cache_dir
+        self.size = size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def thumb_path(self, path, stat):
+        key = hashlib.sha1(f"{path}|{stat[0]}|{stat[1]}|{self.size}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def load_image(self, path, stat):
+        """返回角色卡的缩略图 QImage；磁盘缓存中没有时从原图生成并写入缓存，无法读取时返回空 QImage。
+
+        可以在工作线程中调用。
+        """
+        thumb_path = self.thumb_path(path, stat)
+        if os.path.exists(thumb_path):
+            image = QImageReader(thumb_path).read()
+            if not image.isNull():
+                return image
+
+        reader = QImageReader(path)
+        size = reader.size()
+        if not size.isValid():
+            return QImage()
+        # 让解码器直接输出目标尺寸，JPEG 等格式可以在解码阶段就缩小，不必先得到整张原图
+        reader.setScaledSize(size.scaled(self.size, self.size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            return image
+
+        temp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+        if image.save(temp_path, 'PNG'):
+            try:
+                os.replace(temp_path, thumb_path)
+            except OSError:
+                pass
+        return image
+
+    def prune(self, keep_paths):
+        """删除不在 keep_paths 中的缩略图文件。"""
+        keep_names = {os.path.basename(path) for path in keep_paths if path}
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name not in keep_names:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
@@ -0,0 +1,122 @@
+# trash_bin.py
+
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+TRASH_DIR_NAME = ".trash"
+UNDO_WINDOW_MS = 30000
+
+
+class TrashBin(QObject):
+    """工作区中的回收站：删除角色卡时只把文件改名移入 .trash 下的批次目录，真正的删除在后台进行。
+
+    回收站与工作区在同一文件系统上，每个文件只需一次 os.replace；目录以 "." 开头，扫描工作区时会被跳过。
+    每次删除是一个批次，在 UNDO_WINDOW_MS 内可以整批还原，过期后交给后台线程删除整个批次目录。
+    上次运行遗留的批次（退出时仍在撤销窗口内的）在启动时直接清理。
+    """
+
+    expired = Signal(str)       # 批次编号，撤销窗口已结束
+    purged = Signal(list)       # 该批次中不会再还原的原路径
+
+    def __init__(self, workspace, undo_window_ms=UNDO_WINDOW_MS, parent=None):
+        super().__init__(parent)
+        self.directory = os.path.join(workspace, TRASH_DIR_NAME)
+        self.undo_window_ms = undo_window_ms
+        self._batches = {}      # 批次编号 -> [(原路径, 回收站中的路径)]
+        self._timers = {}
+        self._counter = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            self._executor.submit(shutil.rmtree, os.path.join(self.directory, name), True)
+
+    def move_to_trash(self, paths):
+        """把文件移入新批次，返回 (批次编号, 已移入的原路径, [(原路径, 错误信息)])；本来就不存在的文件视为已移入。"""
+        batch_id, batch_dir = self._new_batch_dir()
+        entries = []
+        moved = []
+        errors = []
+        for i, path in enumerate(paths):
+            trashed_path = os.path.join(batch_dir, f"{i}_{os.path.basename(path)}")
+            try:
+                os.replace(path, trashed_path)
+            except FileNotFoundError:
+                moved.append(path)
+                continue
+            except OSError as e:
+                errors.append((path, str(e)))
+                continue
+            entries.append((path, trashed_path))
+            moved.append(path)
+
+        self._batches[batch_id] = entries
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda: self.purge(batch_id))
+        timer.start(self.undo_window_ms)
+        self._timers[batch_id] = timer
+        return batch_id, moved, errors
+
+    def _new_batch_dir(self):
+        # 时间精度较粗或连续快速删除时时间戳可能重复，加上递增计数，仍然撞上已有目录就换下一个
+        while True:
+            self._counter += 1
+            batch_id = f"{time.time_ns()}_{self._counter}"
+            batch_dir = os.path.join(self.directory, batch_id)
+            try:
+                os.makedirs(batch_dir)
+            except FileExistsError:
+                continue
+            return batch_id, batch_dir
+
+    def last_batch(self):
+        """最近一个仍可撤销的批次编号，没有时返回 None。"""
+        return next(reversed(self._batches), None)
+
+    def restore(self, batch_id):
+        """把批次中的文件改名回原处，返回 (已还原的原路径, 未能还原的原路径)。
+
+        原位置已被其他文件占用的不会覆盖，随批次一起删除。
+        """
+        entries = self._batches.get(batch_id)
+        if entries is None:
+            return [], []
+        restored = []
+        remaining = []
+        for path, trashed_path in entries:
+            try:
+                if os.path.exists(path):
+                    raise FileExistsError(path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(trashed_path, path)
+            except OSError:
+                remaining.append((path, trashed_path))
+                continue
+            restored.append(path)
+        self._batches[batch_id] = remaining
+        self.purge(batch_id)
+        return restored, [path for path, _ in remaining]
+
+    def purge(self, batch_id):
+        """结束批次的撤销窗口，在后台删除批次目录。"""
+        timer = self._timers.pop(batch_id, None)
+        if timer is not None:
+            timer.stop()
+            timer.deleteLater()
+        entries = self._batches.pop(batch_id, None)
+        if entries is None:
+            return
+        self._executor.submit(shutil.rmtree, os.path.join(self.directory, batch_id), True)
+        self.expired.emit(batch_id)
+        if entries:
+            self.purged.emit([path for path, _ in entries])
+
+    def shutdown(self):
+        """退出时不再等待撤销窗口：未过期的批次留到下次启动时清理，已经开始的后台删除照常完成。"""
+        for timer in self._timers.values():
+            timer.stop()
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,56 @@
+# workspace_watcher.py
+
+import os
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer, Signal
+
+WATCH_DEBOUNCE_MS = 300
+
+
+class WorkspaceWatcher(QObject):
+    """监视角色卡工作区，把短时间内的一串文件系统事件合并成一次 changed 信号。
+
+    目录监视能发现新增、删除、改名和“写临时文件再替换”式的保存；原地改写文件内容不会触发目录事件，
+    所以正在详情页中打开的角色卡另外单独监视。
+    """
+
+    changed = Signal()
+
+    def __init__(self, directory, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self._watcher = QFileSystemWatcher([directory], self)
+        self._watched_file = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(WATCH_DEBOUNCE_MS)
+        self._timer.timeout.connect(self._flush)
+        self._watcher.directoryChanged.connect(self._schedule)
+        self._watcher.fileChanged.connect(self._schedule)
+
+    def _schedule(self, _path):
+        # 每个新事件都重新计时，等批量复制、解压之类的操作安静下来再处理
+        self._timer.start()
+
+    def _flush(self):
+        if self._watched_file:
+            self.watch_file(self._watched_file)
+        self.changed.emit()
+
+    def set_directories(self, directories):
+        """监视的目录改为 directories（开启子文件夹扫描时包括各级子目录）。"""
+        current = set(self._watcher.directories())
+        wanted = set(directories)
+        if current - wanted:
+            self._watcher.removePaths(list(current - wanted))
+        if wanted - current:
+            self._watcher.addPaths(list(wanted - current))
+
+    def watch_file(self, path):
+        """单独监视一个文件（同一时间只有一个）；传入 None 取消。"""
+        if self._watched_file and self._watched_file != path:
+            self._watcher.removePath(self._watched_file)
+        self._watched_file = path
+        # 文件被替换后监视会失效，重新加入；已在监视中时 addPath 不做任何事
+        if path and os.path.exists(path) and path not in self._watcher.files():
+            self._watcher.addPath(path)